@@ -1,7 +1,11 @@
 """
 backend/agents/grading_agent.py
 """
+import asyncio
+from core.config import settings
 from core.llm import llm
+from core.router import approx_tokens
+from core.lazy import Lazy
 
 GRADE_SCALE = [
     (90, "A+", "Outstanding"),
@@ -15,9 +19,9 @@ GRADE_SCALE = [
 
 class GradingAgent:
 
-    def parse_answers(self, ocr_text: str, questions: list) -> dict:
-        nums = [q.get("number", f"Q{i+1}") for i, q in enumerate(questions)]
-        prompt = f"""Map handwritten answers to question numbers.
+    @staticmethod
+    def _parse_prompt(ocr_text: str, nums: list) -> str:
+        return f"""Map handwritten answers to question numbers.
 Questions in this paper: {nums}
 
 FULL OCR TEXT:
@@ -25,16 +29,29 @@ FULL OCR TEXT:
 
 Return ONLY JSON: {{"Q1":"answer text","Q2":"answer text"}}
 Use "No answer provided" for missing answers."""
-        result = llm.ask_json(prompt, cache=False)
+
+    @staticmethod
+    def _answer_map(result, nums: list) -> dict:
         if not isinstance(result, dict):
             result = {}
         for n in nums:
             result.setdefault(n, "No answer provided")
         return result
 
-    def grade_one(self, q_num: str, student_ans: str,
-                  model_ans: str, marks: int, topic: str) -> dict:
-        prompt = f"""Grade this exam answer strictly but fairly.
+    def parse_answers(self, ocr_text: str, questions: list) -> dict:
+        nums = [q.get("number", f"Q{i+1}") for i, q in enumerate(questions)]
+        result = llm.ask_json(self._parse_prompt(ocr_text, nums), cache=False)
+        return self._answer_map(result, nums)
+
+    async def aparse_answers(self, ocr_text: str, questions: list) -> dict:
+        nums = [q.get("number", f"Q{i+1}") for i, q in enumerate(questions)]
+        result = await llm.aask_json(self._parse_prompt(ocr_text, nums), cache=False)
+        return self._answer_map(result, nums)
+
+    @staticmethod
+    def _grade_prompt(q_num: str, student_ans: str,
+                      model_ans: str, marks: int, topic: str) -> str:
+        return f"""Grade this exam answer strictly but fairly.
 
 Q{q_num} | Topic: {topic} | Max marks: {marks}
 MODEL ANSWER: {model_ans}
@@ -49,14 +66,19 @@ Return ONLY JSON:
   "missing_points": ["missing1","missing2"],
   "feedback": "2-3 sentences of actionable feedback"
 }}"""
-        r = llm.ask_json(prompt, cache=False)
+
+    @staticmethod
+    def _finish_grade(r, student_ans: str, marks: int) -> dict:
         if not isinstance(r, dict) or "marks_awarded" not in r:
+            # No usable grade even after the router's retries: say so rather
+            # than invent a score
             r = {
-                "marks_awarded": int(marks * 0.5),
-                "grade": "Satisfactory",
+                "marks_awarded": 0,
+                "grade": "Ungraded",
+                "ungraded": True,
                 "correct_points": [],
-                "missing_points": ["Could not fully parse answer"],
-                "feedback": "Partially correct. Review topic carefully.",
+                "missing_points": [],
+                "feedback": "Could not be graded automatically. Retry grading or mark by hand.",
             }
         awarded = max(0, min(marks, int(r.get("marks_awarded", 0))))
         r["marks_awarded"]  = awarded
@@ -65,6 +87,164 @@ Return ONLY JSON:
         r["student_answer"] = student_ans[:400]
         return r
 
+    def grade_one(self, q_num: str, student_ans: str,
+                  model_ans: str, marks: int, topic: str) -> dict:
+        prompt = self._grade_prompt(q_num, student_ans, model_ans, marks, topic)
+        r = llm.ask_json(prompt, cache=False)
+        return self._finish_grade(r, student_ans, marks)
+
+    async def agrade_one(self, q_num: str, student_ans: str,
+                         model_ans: str, marks: int, topic: str) -> dict:
+        prompt = self._grade_prompt(q_num, student_ans, model_ans, marks, topic)
+        r = await llm.aask_json(prompt, cache=False)
+        return self._finish_grade(r, student_ans, marks)
+
+    # ── Batched grading ──────────────────────────────────
+    approx_tokens = staticmethod(approx_tokens)
+
+    @staticmethod
+    def _batch_item(q: dict, student_answers: dict) -> dict:
+        qn = q.get("number", "Q1")
+        return {
+            "number":  qn,
+            "student": student_answers.get(qn, "No answer provided"),
+            "model":   q.get("model_answer", ""),
+            "marks":   q.get("marks", 10),
+            "topic":   q.get("topic", "General"),
+        }
+
+    @staticmethod
+    def _batch_block(it: dict) -> str:
+        return f"""### {it['number']} | Topic: {it['topic']} | Max marks: {it['marks']}
+MODEL ANSWER: {it['model']}
+STUDENT ANSWER: {it['student']}"""
+
+    @classmethod
+    def _batch_prompt(cls, items: list) -> str:
+        blocks = "\n\n".join(cls._batch_block(it) for it in items)
+        return f"""Grade each exam answer below strictly but fairly.
+Award marks for every correct concept. Apply partial credit fairly.
+
+{blocks}
+
+Return ONLY JSON mapping every question number above to its grade:
+{{
+  "<question number>": {{
+    "marks_awarded": <int 0-max marks>,
+    "grade": "Excellent|Good|Satisfactory|Needs Improvement|Incorrect",
+    "correct_points": ["point1","point2"],
+    "missing_points": ["missing1","missing2"],
+    "feedback": "2-3 sentences of actionable feedback"
+  }}
+}}"""
+
+    @classmethod
+    def pack_batches(cls, items: list, size: int = 0, budget: int = 0) -> list[list]:
+        """Greedily split items into batches of at most `size` questions whose
+        question blocks fit in `budget` prompt tokens. An item that alone
+        exceeds the budget still gets a batch of its own."""
+        size   = size or settings.GRADING_BATCH_SIZE
+        budget = budget or settings.GRADING_BATCH_TOKENS
+        batches, cur, used = [], [], 0
+        for it in items:
+            cost = cls.approx_tokens(cls._batch_block(it))
+            if cur and (len(cur) >= size or used + cost > budget):
+                batches.append(cur)
+                cur, used = [], 0
+            cur.append(it)
+            used += cost
+        if cur:
+            batches.append(cur)
+        return batches
+
+    async def agrade_batch(self, items: list) -> dict:
+        """Grade several questions with one prompt. Any question the reply
+        leaves out (or garbles) is re-graded on its own."""
+        if len(items) == 1:
+            it = items[0]
+            return {it["number"]: await self.agrade_one(
+                it["number"], it["student"], it["model"], it["marks"], it["topic"])}
+
+        reply = await llm.aask_json(self._batch_prompt(items), cache=False)
+        if not isinstance(reply, dict):
+            reply = {}
+        out, missed = {}, []
+        for it in items:
+            r = reply.get(it["number"])
+            if isinstance(r, dict) and "marks_awarded" in r:
+                out[it["number"]] = self._finish_grade(r, it["student"], it["marks"])
+            else:
+                missed.append(it)
+        if missed:
+            redone = await asyncio.gather(*(self.agrade_one(
+                it["number"], it["student"], it["model"], it["marks"], it["topic"])
+                for it in missed))
+            out.update({it["number"]: r for it, r in zip(missed, redone)})
+        return out
+
+    async def agrade_all(self, questions: list, student_answers: dict,
+                         batch_size: int | None = None) -> dict:
+        """Grade every question concurrently; the router caps calls in flight
+        per provider. With batch_size > 1 (default GRADING_BATCH_SIZE) questions
+        are packed into shared prompts. Results are keyed by question number in
+        paper order."""
+        size    = settings.GRADING_BATCH_SIZE if batch_size is None else batch_size
+        items   = [self._batch_item(q, student_answers) for q in questions]
+        batches = self.pack_batches(items, size=max(1, size))
+        graded  = {}
+        for part in await asyncio.gather(*(self.agrade_batch(b) for b in batches)):
+            graded.update(part)
+        return {it["number"]: graded[it["number"]] for it in items}
+
+    # ── Whole-class grading ──────────────────────────────
+    async def agrade_script(self, mock: dict, script: dict) -> dict:
+        """Parse and grade one student's script."""
+        qs      = mock.get("questions", [])
+        answers = await self.aparse_answers(script["ocr_text"], qs)
+        results = await self.agrade_all(qs, answers)
+        earned, pct, letter = self.score(results, mock.get("total_marks", 100))
+        return {
+            "student_id":      script["student_id"],
+            "grading_results": results,
+            "marks_earned":    earned,
+            "total_score":     pct,
+            "grade_letter":    letter,
+            "ungraded":        self.ungraded(results),
+        }
+
+    async def agrade_class(self, mock: dict, scripts: list):
+        """Yield (script, result) as each student's grading finishes. `result`
+        is the exception if that script failed. At most GRADE_CLASS_CONCURRENCY
+        students are in flight, in order, so results stream in steadily rather
+        than all parses queueing ahead of every grade."""
+        students = asyncio.Semaphore(max(1, settings.GRADE_CLASS_CONCURRENCY))
+
+        async def _one(script: dict):
+            async with students:
+                try:
+                    return script, await self.agrade_script(mock, script)
+                except Exception as e:
+                    return script, e
+
+        tasks = [asyncio.create_task(_one(s)) for s in scripts]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def score(self, results: dict, total: float) -> tuple[float, float, str]:
+        """→ (marks earned, percentage of `total`, letter grade)"""
+        earned = sum(r["marks_awarded"] for r in results.values())
+        pct    = round(earned / total * 100, 1) if total > 0 else 0
+        return earned, pct, self.letter_grade(pct)[0]
+
+    @staticmethod
+    def ungraded(results: dict) -> list[str]:
+        """Question numbers that still need grading (scored 0 for now)."""
+        return [qn for qn, r in results.items() if r.get("ungraded")]
+
     @staticmethod
     def letter_grade(pct: float) -> tuple[str, str]:
         for threshold, letter, desc in GRADE_SCALE:
@@ -94,19 +274,33 @@ Return ONLY JSON:
         lines += ["", "=" * 62, f"  FINAL GRADE  →  {letter}  ({pct:.1f}%)", "=" * 62]
         return "\n".join(lines)
 
-    def post_grade_feedback(self, results: dict, score: float,
-                            letter: str, subject: str) -> str:
+    @staticmethod
+    def _feedback_prompt(results: dict, score: float,
+                         letter: str, subject: str) -> str:
         weak = sorted(
             [(qn, r) for qn, r in results.items() if isinstance(r, dict)],
             key=lambda x: x[1].get("percentage", 100)
         )[:3]
         weak_topics = [r.get("topic", qn) for qn, r in weak]
-        prompt = f"""Personalised post-exam feedback.
+        return f"""Personalised post-exam feedback.
 Subject: {subject} | Score: {score:.1f}% | Grade: {letter}
 Weakest areas: {weak_topics}
 Write: (1) acknowledge effort (2) top 3 improvements as bullets (3) 48-hour study plan (4) encouragement.
 Be warm, honest, specific."""
-        return llm.ask(prompt, cache=False)
+
+    def post_grade_feedback(self, results: dict, score: float,
+                            letter: str, subject: str) -> str:
+        return llm.ask(self._feedback_prompt(results, score, letter, subject), cache=False)
+
+    async def apost_grade_feedback(self, results: dict, score: float,
+                                   letter: str, subject: str) -> str:
+        return await llm.aask(
+            self._feedback_prompt(results, score, letter, subject), cache=False
+        )
+
+    def stream_post_grade_feedback(self, results: dict, score: float,
+                                   letter: str, subject: str):
+        return llm.stream(self._feedback_prompt(results, score, letter, subject), cache=False)
 
 
-grading_agent = GradingAgent()
+grading_agent = Lazy(GradingAgent)
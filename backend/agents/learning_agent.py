@@ -1,9 +1,14 @@
 """
 backend/agents/learning_agent.py — adaptive learning pipeline
 """
+import asyncio, hashlib, json
 import numpy as np
-from core.llm import llm
+from core.config import settings
+from core.llm import llm, STREAM_REPLAY_CHUNK
 from core.dataset import dataset
+from core.ratelimit import priority, BACKGROUND
+from core.topic_store import TopicStore
+from core.lazy import Lazy
 
 KNOWLEDGE_GRAPH = {
     "Data Structures":         ["Arrays and Strings","Linked Lists","Stacks and Queues","Trees and BST","Graphs","Hash Tables"],
@@ -30,28 +35,58 @@ DOMAIN_MAP = {
 }
 
 
+GRAPH_TOPICS = [t for ts in KNOWLEDGE_GRAPH.values() for t in ts]
+
+# Closest xAPI-Edu-Data Topic to each domain, for cohort baselines
+DATASET_TOPIC = {domain: "IT" for domain in KNOWLEDGE_GRAPH} | {"Algorithms": "Math"}
+
+
 class LearningAgent:
 
-    def plan(self, goal: str) -> list[str]:
+    def __init__(self):
+        # Precomputed content/questions for GRAPH_TOPICS (see warm_up)
+        self.store = TopicStore()
+
+    @staticmethod
+    def _match_domain(goal: str) -> list[str] | None:
         gl = goal.lower()
         for keywords, domain in DOMAIN_MAP.items():
             if any(k in gl for k in keywords):
                 return KNOWLEDGE_GRAPH.get(domain, ["Programming Fundamentals"])[:4]
-        # LLM fallback
-        all_topics = [t for ts in KNOWLEDGE_GRAPH.values() for t in ts]
-        r = llm.ask_json(
+        return None
+
+    @staticmethod
+    def _plan_prompt(goal: str) -> str:
+        return (
             f'Pick 4 topics from this list for goal: "{goal}"\n'
-            f'Topics: {all_topics[:30]}\n'
+            f'Topics: {GRAPH_TOPICS[:30]}\n'
             'Return JSON array of 4 exact topic names.'
         )
+
+    @staticmethod
+    def _valid_plan(r) -> list[str]:
         if isinstance(r, list) and r:
             valid = [t for t in r if any(t in ts for ts in KNOWLEDGE_GRAPH.values())]
             if valid:
                 return valid[:4]
         return ["Programming Fundamentals", "Data Structures", "Algorithms", "Databases"]
 
-    def generate_content(self, topic: str) -> str:
-        prompt = f"""Write educational content for a B.Tech Computer Science student.
+    def plan(self, goal: str) -> list[str]:
+        path = self._match_domain(goal)
+        if path:
+            return path
+        # LLM fallback
+        return self._valid_plan(llm.ask_json(self._plan_prompt(goal), semantic=("plan", goal)))
+
+    async def aplan(self, goal: str) -> list[str]:
+        path = self._match_domain(goal)
+        if path:
+            return path
+        return self._valid_plan(await llm.aask_json(self._plan_prompt(goal), semantic=("plan", goal)))
+
+    @staticmethod
+    def _content_prompt(topic: str) -> str:
+        return f"""Write educational content for a B.Tech Computer Science student.
 
 Topic: {topic}
 
@@ -69,14 +104,81 @@ Why this topic matters + 2 real-world applications.
 7 bullet points: definitions, complexity, pitfalls, interview tips.
 
 Be rigorous, precise, exam-focused."""
-        return llm.ask(prompt, cache=True)
 
-    def generate_questions(self, topic: str) -> list:
-        prompt = f"""Create 4 exam-quality questions on: {topic}
+    # ── Precomputed store ────────────────────────────────
+    def store_version(self) -> str:
+        """Changes whenever the prompts, model or sampling config change."""
+        raw = json.dumps([llm.model, settings.TEMPERATURE, settings.MAX_TOKENS,
+                          self._content_prompt("{topic}"), self._questions_prompt("{topic}")])
+        return hashlib.sha256(raw.encode()).hexdigest()[:12]
+
+    def _stored(self, kind: str, topic: str):
+        if topic not in GRAPH_TOPICS:
+            return None
+        version = self.store_version()
+        value   = self.store.get(version, kind, topic)
+        if value is None and settings.TOPIC_STORE_SERVE_STALE:
+            # Prompts or model changed: keep serving the old copy until warm-up replaces it
+            value = self.store.get_stale(version, kind, topic)
+        return value
+
+    def _keep(self, kind: str, topic: str, value) -> None:
+        # A fallback provider's answer would be filed under the primary's version
+        if topic in GRAPH_TOPICS and self._usable(kind, value) and llm.from_primary():
+            self.store.put(self.store_version(), kind, topic, value)
+
+    # Async callers read and write the store's files in a thread
+    async def _astored(self, kind: str, topic: str):
+        if topic not in GRAPH_TOPICS:
+            return None
+        return await asyncio.to_thread(self._stored, kind, topic)
+
+    async def _akeep(self, kind: str, topic: str, value) -> None:
+        if topic in GRAPH_TOPICS:
+            await asyncio.to_thread(self._keep, kind, topic, value)
+
+    @staticmethod
+    def _usable(kind: str, value) -> bool:
+        if kind == "content":
+            return isinstance(value, str) and bool(value) and not value.startswith("[LLM")
+        return isinstance(value, list) and bool(value)
+
+    def generate_content(self, topic: str) -> str:
+        if (hit := self._stored("content", topic)) is not None:
+            return hit
+        content = llm.ask(self._content_prompt(topic), cache=True, semantic=("content", topic))
+        self._keep("content", topic, content)
+        return content
+
+    async def agenerate_content(self, topic: str) -> str:
+        if (hit := await self._astored("content", topic)) is not None:
+            return hit
+        content = await llm.aask(self._content_prompt(topic), cache=True, semantic=("content", topic))
+        await self._akeep("content", topic, content)
+        return content
+
+    async def stream_content(self, topic: str):
+        if (hit := await self._astored("content", topic)) is not None:
+            for i in range(0, len(hit), STREAM_REPLAY_CHUNK):
+                yield hit[i:i + STREAM_REPLAY_CHUNK]
+            return
+        parts = []
+        async for chunk in llm.stream(self._content_prompt(topic), cache=True,
+                                      semantic=("content", topic)):
+            parts.append(chunk)
+            yield chunk
+        # Reached only when the stream was read to the end
+        await self._akeep("content", topic, "".join(parts))
+
+    @staticmethod
+    def _questions_prompt(topic: str) -> str:
+        return f"""Create 4 exam-quality questions on: {topic}
 One at each level: easy (definition), medium (application), hard (analysis), advanced (design).
 Return ONLY JSON array:
 [{{"question":"...","difficulty":"easy|medium|hard|advanced","correct_answer":"...","marks":10}}]"""
-        qs = llm.ask_json(prompt, cache=True)
+
+    @staticmethod
+    def _valid_questions(qs, topic: str) -> list:
         if not isinstance(qs, list) or not qs:
             qs = [
                 {"question": f"Define and explain {topic}.",
@@ -86,15 +188,112 @@ Return ONLY JSON array:
             ]
         return qs
 
-    def compute_mastery_and_feedback(self, topic: str) -> tuple[float, str]:
+    def generate_questions(self, topic: str) -> list:
+        if (hit := self._stored("questions", topic)) is not None:
+            return hit
+        qs = llm.ask_json(self._questions_prompt(topic), cache=True,
+                          semantic=("questions", topic))
+        self._keep("questions", topic, qs)
+        return self._valid_questions(qs, topic)
+
+    async def agenerate_questions(self, topic: str) -> list:
+        if (hit := await self._astored("questions", topic)) is not None:
+            return hit
+        qs = await llm.aask_json(self._questions_prompt(topic), cache=True,
+                                 semantic=("questions", topic))
+        await self._akeep("questions", topic, qs)
+        return self._valid_questions(qs, topic)
+
+    async def warm_up(self, refresh: bool = False, concurrency: int = 0) -> dict:
+        """Generate content and questions for every GRAPH_TOPICS entry missing
+        from the current store version (all of them if `refresh`), at most
+        `concurrency` calls at a time and behind interactive traffic. Once the
+        version is complete, older versions are deleted."""
+        if not llm.model:
+            return {"skipped": "LLM not configured"}
+        version = self.store_version()
+        todo = await asyncio.to_thread(
+            lambda: [(kind, topic) for topic in GRAPH_TOPICS for kind in ("content", "questions")
+                     if refresh or self.store.get(version, kind, topic) is None])
+        sem  = asyncio.Semaphore(max(1, concurrency or settings.TOPIC_WARMUP_CONCURRENCY))
+
+        async def make(kind: str, topic: str) -> bool:
+            async with sem:
+                if kind == "content":
+                    value = await llm.aask(self._content_prompt(topic), cache=not refresh)
+                else:
+                    value = await llm.aask_json(self._questions_prompt(topic), cache=not refresh)
+            if not self._usable(kind, value) or not llm.from_primary():
+                return False
+            await asyncio.to_thread(self.store.put, version, kind, topic, value)
+            return True
+
+        t0 = asyncio.get_running_loop().time()
+        with priority(BACKGROUND):
+            made = await asyncio.gather(*(make(k, t) for k, t in todo))
+        ready = all(self.store.count(version, k) >= len(GRAPH_TOPICS) for k in ("content", "questions"))
+        return {
+            "version":   version,
+            "generated": sum(made),
+            "failed":    len(made) - sum(made),
+            "cached":    2 * len(GRAPH_TOPICS) - len(todo),
+            "pruned":    self.store.prune(keep=version) if ready else [],
+            "seconds":   round(asyncio.get_running_loop().time() - t0, 2),
+        }
+
+    def store_stats(self) -> dict:
+        version = self.store_version()
+        return {
+            "version":   version,
+            "topics":    len(GRAPH_TOPICS),
+            "content":   self.store.count(version, "content"),
+            "questions": self.store.count(version, "questions"),
+            "versions":  self.store.versions(),
+            "hits":      self.store.hits,
+            "misses":    self.store.misses,
+        }
+
+    @staticmethod
+    def _dataset_topic(topic: str) -> str:
+        domain = topic if topic in KNOWLEDGE_GRAPH else next(
+            (d for d, ts in KNOWLEDGE_GRAPH.items() if topic in ts), "")
+        return DATASET_TOPIC.get(domain, "IT")
+
+    @classmethod
+    def _score_mastery(cls, topic: str) -> tuple[float, str]:
+        cohort     = cls._dataset_topic(topic)
         engagement = float(np.random.uniform(45, 85))
-        mastery    = dataset.compute_mastery(engagement)
-        summary    = dataset.summary()
+        mastery    = dataset.compute_mastery(engagement, topic=cohort)
+        _, avg     = dataset.baseline(cohort)
         prompt = f"""Personalised study feedback.
-Topic: {topic} | Mastery: {mastery:.1%} | Dataset avg: {summary['avg_performance']:.1%}
+Topic: {topic} | Mastery: {mastery:.1%} | {cohort} cohort avg: {avg:.1%}
 Write 3 paragraphs: (1) what was achieved (2) one area to strengthen (3) next step + encouragement."""
-        feedback = llm.ask(prompt, cache=False)
-        return mastery, feedback
+        return mastery, prompt
+
+    def compute_mastery_and_feedback(self, topic: str) -> tuple[float, str]:
+        mastery, prompt = self._score_mastery(topic)
+        return mastery, llm.ask(prompt, cache=False)
+
+    async def acompute_mastery_and_feedback(self, topic: str) -> tuple[float, str]:
+        mastery, prompt = self._score_mastery(topic)
+        return mastery, await llm.aask(prompt, cache=False)
+
+    @staticmethod
+    def _wrap_up_prompt(goal: str, path: list[str], avg: float) -> str:
+        return (
+            f'Wrap up a learning session. Goal: "{goal}". '
+            f'Topics: {path}. Avg mastery: {avg:.1%}. '
+            'Write 2 encouraging sentences and suggest what to study next.'
+        )
+
+    @staticmethod
+    def _result(path: list[str], topics: list[dict], avg: float, overall_fb: str) -> dict:
+        return {
+            "learning_path":  path,
+            "topics_covered": topics,
+            "avg_mastery":    round(avg, 3),
+            "feedback_text":  overall_fb,
+        }
 
     def run(self, goal: str) -> dict:
         path    = self.plan(goal)
@@ -117,19 +316,55 @@ Write 3 paragraphs: (1) what was achieved (2) one area to strengthen (3) next st
         avg = float(np.mean(list(mastery.values()))) if mastery else 0.0
 
         # Overall feedback
-        overall_fb = llm.ask(
-            f'Wrap up a learning session. Goal: "{goal}". '
-            f'Topics: {path}. Avg mastery: {avg:.1%}. '
-            'Write 2 encouraging sentences and suggest what to study next.',
-            cache=False
-        )
+        overall_fb = llm.ask(self._wrap_up_prompt(goal, path, avg), cache=False)
+        return self._result(path, topics, avg, overall_fb)
 
+    async def _atopic(self, topic: str) -> dict:
+        content, questions, (m, fb) = await asyncio.gather(
+            self.agenerate_content(topic),
+            self.agenerate_questions(topic),
+            self.acompute_mastery_and_feedback(topic),
+        )
         return {
-            "learning_path":  path,
-            "topics_covered": topics,
-            "avg_mastery":    round(avg, 3),
-            "feedback_text":  overall_fb,
+            "topic":     topic,
+            "mastery":   m,
+            "content":   content,
+            "questions": questions,
+            "feedback":  fb,
         }
 
+    async def astream(self, goal: str):
+        """Yield ("plan", ...), then ("topic", ...) per topic as it finishes,
+        then ("done", full result) once the wrap-up feedback is written."""
+        path = await self.aplan(goal)
+        yield "plan", {"learning_path": path}
+
+        # No limit here: the router caps calls per provider across all streams
+        async def indexed(i: int, topic: str) -> tuple[int, dict]:
+            return i, await self._atopic(topic)
+
+        tasks  = [asyncio.create_task(indexed(i, t)) for i, t in enumerate(path)]
+        topics = [None] * len(path)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, topic  = await next_done
+                topics[i] = topic
+                yield "topic", {"index": i, **topic}
+        finally:
+            # Consumer went away (e.g. client disconnect) — stop paying for the rest
+            for t in tasks:
+                t.cancel()
+
+        avg = float(np.mean([t["mastery"] for t in topics])) if topics else 0.0
+        overall_fb = await llm.aask(self._wrap_up_prompt(goal, path, avg), cache=False)
+        yield "done", self._result(path, topics, avg, overall_fb)
+
+    async def arun(self, goal: str) -> dict:
+        """plan → every topic's content/questions/feedback at once → wrap-up.
+        The wrap-up waits for all masteries; everything before it is independent."""
+        async for event, data in self.astream(goal):
+            if event == "done":
+                return data
+
 
-learning_agent = LearningAgent()
+learning_agent = Lazy(LearningAgent)
@@ -1,15 +1,52 @@
 """
 backend/agents/mock_generator.py
 """
-import json, uuid
-from datetime import datetime
+import asyncio, hashlib, json, os, time, uuid
+from functools import lru_cache
 from core.llm import llm
 from core.config import settings
+from core.lazy import Lazy
+
+
+@lru_cache(maxsize=1)
+def _pdf_styles() -> dict:
+    """reportlab stylesheet + paragraph styles, built once per process."""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    return {
+        "Normal": styles["Normal"],
+        "T": ParagraphStyle("T", parent=styles["Title"], fontSize=16,
+                            spaceAfter=4, alignment=1, fontName="Helvetica-Bold"),
+        "Q": ParagraphStyle("Q", parent=styles["Normal"], fontSize=11,
+                            spaceAfter=6, leading=16),
+        "S": ParagraphStyle("S", parent=styles["Normal"], fontSize=10,
+                            spaceAfter=4, leftIndent=24, leading=15),
+        "A": ParagraphStyle("A", parent=styles["Normal"], fontSize=10,
+                            spaceAfter=6, textColor=colors.grey,
+                            leftIndent=12, leading=14),
+        "info": TableStyle([
+            ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
+            ("FONTNAME", (2,0), (2,-1), "Helvetica-Bold"),
+            ("FONTSIZE", (0,0), (-1,-1), 10),
+            ("GRID",     (0,0), (-1,-1), 0.25, colors.lightgrey),
+            ("PADDING",  (0,0), (-1,-1), 4),
+        ]),
+    }
 
 
 class MockGeneratorAgent:
 
-    def generate(self, analysis: dict) -> list:
+    PRUNE_EVERY = 600   # seconds between scans of MOCK_PDF_DIR for stale mocks
+
+    def __init__(self):
+        self._rendering: dict[str, asyncio.Future] = {}
+        self._pruned = 0.0
+
+    @staticmethod
+    def _generate_prompt(analysis: dict) -> str:
         n   = max(len(analysis.get("questions", [])), 6)
         sub = analysis.get("subject", "CS")
         top = analysis.get("topics", ["General"])
@@ -18,7 +55,7 @@ class MockGeneratorAgent:
         qtp = analysis.get("type_distribution", {})
         ori = json.dumps(analysis.get("questions", [])[:4], indent=2)
 
-        prompt = f"""You are setting a NEW exam paper for: {sub}
+        return f"""You are setting a NEW exam paper for: {sub}
 
 Original paper info — Topics: {top} | Total marks: {tot}
 Difficulty split: {dif} | Question types: {qtp}
@@ -43,7 +80,11 @@ Return ONLY a JSON array:
   "model_answer": "complete model answer"
 }}]"""
 
-        qs = llm.ask_json(prompt, cache=False)
+    @staticmethod
+    def _valid_questions(qs, analysis: dict) -> list:
+        n   = max(len(analysis.get("questions", [])), 6)
+        top = analysis.get("topics", ["General"])
+        tot = analysis.get("total_marks", 100)
         if not isinstance(qs, list) or not qs:
             each = tot // n
             qs = [
@@ -61,31 +102,109 @@ Return ONLY a JSON array:
             ]
         return qs
 
+    def generate(self, analysis: dict) -> list:
+        qs = llm.ask_json(self._generate_prompt(analysis), cache=False)
+        return self._valid_questions(qs, analysis)
+
+    async def agenerate(self, analysis: dict) -> list:
+        qs = await llm.aask_json(self._generate_prompt(analysis), cache=False)
+        return self._valid_questions(qs, analysis)
+
+    @staticmethod
+    def mock_digest(mock: dict) -> str:
+        # created_at differs on every request; the paper itself is what matters
+        body = {k: v for k, v in mock.items() if k != "created_at"}
+        return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _pending(digest: str):
+        return settings.MOCK_PDF_DIR / f"mock_{digest}.json"
+
+    def remember(self, mock: dict) -> str:
+        """Register a mock for lazy PDF rendering; returns its PDF filename.
+        The mock waits on disk beside the PDFs until its PDF is rendered, so
+        the URL stays valid across cache evictions, restarts and workers."""
+        digest = self.mock_digest(mock)
+        if not (settings.MOCK_PDF_DIR / f"mock_{digest}.pdf").exists():
+            settings.MOCK_PDF_DIR.mkdir(parents=True, exist_ok=True)
+            pending = self._pending(digest)
+            tmp     = f"{pending}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(mock, f)
+            os.replace(tmp, pending)
+        return f"mock_{digest}.pdf"
+
+    async def aremember(self, mock: dict) -> str:
+        return await asyncio.to_thread(self.remember, mock)
+
+    def prune_pending(self, force: bool = False) -> int:
+        """Delete mocks whose PDF was never requested within MOCK_PENDING_TTL
+        seconds (0 keeps them forever). Scans at most every PRUNE_EVERY seconds
+        unless `force`; returns the number of files removed."""
+        ttl = settings.MOCK_PENDING_TTL
+        now = time.time()
+        if not ttl or (not force and now - self._pruned < self.PRUNE_EVERY):
+            return 0
+        self._pruned = now
+        removed = 0
+        for path in settings.MOCK_PDF_DIR.glob("mock_*.json*"):
+            try:
+                if now - path.stat().st_mtime > ttl:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _render(self, digest: str, filename: str) -> str:
+        pending = self._pending(digest)
+        try:
+            mock = json.loads(pending.read_text())
+        except FileNotFoundError:
+            # Another worker may have just rendered it and dropped the mock
+            path = settings.MOCK_PDF_DIR / filename
+            return str(path) if path.exists() else ""
+        path = self.export_pdf(mock, filename)
+        if path:
+            pending.unlink(missing_ok=True)
+        return path
+
+    async def aget_pdf(self, filename: str) -> str:
+        """Path of a mock PDF, rendering it on first request. "" if unknown.
+        Concurrent requests for the same paper share one render."""
+        path = settings.MOCK_PDF_DIR / filename
+        if path.exists():
+            return str(path)
+        digest = filename.removeprefix("mock_").removesuffix(".pdf")
+        if digest not in self._rendering:
+            if not self._pending(digest).exists():
+                return ""
+            self._rendering[digest] = asyncio.ensure_future(
+                asyncio.to_thread(self._render, digest, filename)
+            )
+            self._rendering[digest].add_done_callback(
+                lambda _: self._rendering.pop(digest, None)
+            )
+        return await asyncio.shield(self._rendering[digest])
+
     def export_pdf(self, mock: dict, filename: str) -> str:
+        settings.setup()
         path = str(settings.MOCK_PDF_DIR / filename)
+        tmp  = f"{path}.{uuid.uuid4().hex}.tmp"
         try:
             from reportlab.lib.pagesizes import A4
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
             from reportlab.lib import colors
             from reportlab.lib.units import inch
             from reportlab.platypus import (
-                SimpleDocTemplate, Paragraph, Spacer, Table,
-                TableStyle, HRFlowable
+                SimpleDocTemplate, Paragraph, Spacer, Table, HRFlowable
             )
 
-            doc    = SimpleDocTemplate(path, pagesize=A4,
+            # Written under a temp name so other workers never serve half a file
+            doc    = SimpleDocTemplate(tmp, pagesize=A4,
                                        leftMargin=inch, rightMargin=inch,
                                        topMargin=inch, bottomMargin=inch)
-            styles = getSampleStyleSheet()
-            T = ParagraphStyle("T", parent=styles["Title"], fontSize=16,
-                               spaceAfter=4, alignment=1, fontName="Helvetica-Bold")
-            Q = ParagraphStyle("Q", parent=styles["Normal"], fontSize=11,
-                               spaceAfter=6, leading=16)
-            S = ParagraphStyle("S", parent=styles["Normal"], fontSize=10,
-                               spaceAfter=4, leftIndent=24, leading=15)
-            A = ParagraphStyle("A", parent=styles["Normal"], fontSize=10,
-                               spaceAfter=6, textColor=colors.grey,
-                               leftIndent=12, leading=14)
+            styles = _pdf_styles()
+            T, Q, S, A = styles["T"], styles["Q"], styles["S"], styles["A"]
             DL = {"easy": "[E]", "medium": "[M]", "hard": "[H]"}
             story = []
             story.append(Paragraph("MOCK EXAMINATION PAPER", T))
@@ -96,13 +215,7 @@ Return ONLY a JSON array:
                   "Duration:", mock.get("duration", "3 Hours")]],
                 colWidths=[1.2*inch, 2.3*inch, 1.2*inch, 2.3*inch],
             )
-            info.setStyle(TableStyle([
-                ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
-                ("FONTNAME", (2,0), (2,-1), "Helvetica-Bold"),
-                ("FONTSIZE", (0,0), (-1,-1), 10),
-                ("GRID",     (0,0), (-1,-1), 0.25, colors.lightgrey),
-                ("PADDING",  (0,0), (-1,-1), 4),
-            ]))
+            info.setStyle(styles["info"])
             story.append(info)
             story.append(Spacer(1, 8))
             story.append(HRFlowable(width="100%", thickness=1.5, color=colors.darkblue))
@@ -135,10 +248,14 @@ Return ONLY a JSON array:
                 story.append(Spacer(1, 6))
 
             doc.build(story)
+            os.replace(tmp, path)
             return path
         except Exception as e:
             print(f"PDF export failed: {e}")
             return ""
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
 
 
-mock_generator = MockGeneratorAgent()
+mock_generator = Lazy(MockGeneratorAgent)
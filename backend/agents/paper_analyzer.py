@@ -1,32 +1,90 @@
 """
 backend/agents/paper_analyzer.py
 """
+import asyncio, hashlib, io, json, re
+from core.config import settings
 from core.llm import llm
+from core.cache import make_cache
+from core.semantic import semantic_index
+from core.ocr import ocr_pool
+from core.uploads import aas_bytes, as_bytes
+from core.lazy import Lazy
+
+EXTRACT_ERRORS = ("[PDF extraction error", "[Image OCR error")
+QUESTION_LINE  = re.compile(r"^\s*(?:Q\.?\s*\d+|\d+[.)])\s*(.+)$", re.M | re.I)
 
 
 class PaperAnalyzerAgent:
 
-    def extract_pdf(self, path: str) -> str:
+    def __init__(self):
+        # Content-addressed: uploaded bytes → text, normalised text → analysis
+        self.text_cache     = make_cache("paper_text")
+        self.analysis_cache = make_cache("paper_analysis")
+
+    @staticmethod
+    def file_digest(src) -> str:
+        """`src` is bytes, a path, or an open binary file (read from the start)."""
+        h = hashlib.sha256()
+        if isinstance(src, bytes):
+            h.update(src)
+            return h.hexdigest()
+        f = open(src, "rb") if isinstance(src, str) else src
+        try:
+            f.seek(0)
+            while chunk := f.read(1024 * 1024):
+                h.update(chunk)
+        finally:
+            if f is not src:
+                f.close()
+        return h.hexdigest()
+
+    @staticmethod
+    def text_digest(paper_text: str) -> str:
+        # Whitespace/line-break differences between uploads of one paper don't matter
+        normalised = re.sub(r"\s+", " ", paper_text).strip()
+        return hashlib.sha256(f"{llm.model}\n{normalised}".encode()).hexdigest()
+
+    # Static so the process pool pickles a function reference, not the agent
+    @staticmethod
+    def extract_pdf(src) -> str:
         try:
             import fitz
-            doc  = fitz.open(path)
+            if isinstance(src, str):
+                doc = fitz.open(src)
+            else:
+                doc = fitz.open(stream=as_bytes(src), filetype="pdf")
             text = "\n".join(p.get_text() for p in doc)
             doc.close()
             return text.strip()
         except Exception as e:
             return f"[PDF extraction error: {e}]"
 
-    def extract_image(self, path: str) -> str:
+    @staticmethod
+    def extract_image(src: str | bytes) -> str:
         try:
             import pytesseract
             from PIL import Image
-            img = Image.open(path).convert("L")
+            img = Image.open(io.BytesIO(src) if isinstance(src, bytes) else src).convert("L")
             return pytesseract.image_to_string(img, config="--psm 6").strip()
         except Exception as e:
             return f"[Image OCR error: {e}]"
 
-    def analyse(self, paper_text: str) -> dict:
-        prompt = f"""You are an expert examiner. Analyse this exam paper precisely.
+    async def aextract(self, src, pdf: bool) -> tuple[str, str]:
+        """Text of an uploaded paper → (text, file digest). Repeat uploads skip parsing."""
+        digest = await asyncio.to_thread(self.file_digest, src)
+        if (hit := await asyncio.to_thread(self.text_cache.get, digest)) is not None:
+            return hit, digest
+        if pdf:
+            text = await asyncio.to_thread(self.extract_pdf, src)
+        else:
+            text = await ocr_pool.run(self.extract_image, await aas_bytes(src))
+        if text.strip() and not text.startswith(EXTRACT_ERRORS):
+            await asyncio.to_thread(self.text_cache.set, digest, text)
+        return text, digest
+
+    @staticmethod
+    def _analyse_prompt(paper_text: str) -> str:
+        return f"""You are an expert examiner. Analyse this exam paper precisely.
 
 PAPER TEXT:
 {paper_text[:4000]}
@@ -52,7 +110,8 @@ Return ONLY valid JSON — no other text, no markdown:
   "key_concepts": ["c1", "c2", "c3"]
 }}"""
 
-        result = llm.ask_json(prompt, cache=False)
+    @staticmethod
+    def _valid_analysis(result) -> dict:
         if not result or "subject" not in result:
             result = {
                 "subject": "Computer Science",
@@ -66,5 +125,66 @@ Return ONLY valid JSON — no other text, no markdown:
             }
         return result
 
+    @staticmethod
+    def _questions(paper_text: str) -> str:
+        """Just the question lines: papers from one institution share headers
+        and instructions, which would otherwise dominate the similarity."""
+        return "\n".join(m.group(1) for m in QUESTION_LINE.finditer(paper_text))
+
+    @staticmethod
+    def _index():
+        return semantic_index("analysis", llm.model, settings.SEMANTIC_ANALYSIS_THRESHOLD)
+
+    def _lookup(self, key: str, paper_text: str) -> dict | None:
+        """Cached analysis of this paper, or of a near-identical one (the same
+        paper re-scanned with different OCR noise) if semantic matching is on."""
+        if (hit := self.analysis_cache.get(key)) is not None:
+            return json.loads(hit)
+        questions = self._questions(paper_text)
+        if questions and (index := self._index()) is not None:
+            if match := index.match(questions):
+                if (hit := self.analysis_cache.get(match[0])) is not None:
+                    return json.loads(hit)
+                index.discard(match[0])
+        return None
+
+    def _remember(self, key: str, paper_text: str, result) -> dict:
+        # Only real analyses from the primary model are cached, never the
+        # fallback placeholder or a failover provider's answer
+        if isinstance(result, dict) and "subject" in result and llm.from_primary():
+            self.analysis_cache.set(key, json.dumps(result))
+            if (questions := self._questions(paper_text)) and (index := self._index()) is not None:
+                index.add(questions, key)
+        return self._valid_analysis(result)
+
+    def analyse(self, paper_text: str, cache: bool = True) -> dict:
+        key = self.text_digest(paper_text)
+        if cache and (hit := self._lookup(key, paper_text)) is not None:
+            return hit
+        return self._remember(
+            key, paper_text, llm.ask_json(self._analyse_prompt(paper_text), cache=False)
+        )
+
+    async def aanalyse(self, paper_text: str, cache: bool = True) -> dict:
+        key = self.text_digest(paper_text)
+        if cache and (hit := await asyncio.to_thread(self._lookup, key, paper_text)) is not None:
+            return hit
+        result = await llm.aask_json(self._analyse_prompt(paper_text), cache=False)
+        return await asyncio.to_thread(self._remember, key, paper_text, result)
+
+    def invalidate(self, digest: str = "") -> None:
+        """Forget one cached paper (file or text digest), or everything."""
+        index = self._index()
+        if digest:
+            self.text_cache.delete(digest)
+            self.analysis_cache.delete(digest)
+            if index is not None:
+                index.discard(digest)
+        else:
+            self.text_cache.clear()
+            self.analysis_cache.clear()
+            if index is not None:
+                index.clear()
+
 
-paper_analyzer = PaperAnalyzerAgent()
+paper_analyzer = Lazy(PaperAnalyzerAgent)
@@ -0,0 +1,252 @@
+"""
+backend/core/cache.py — bounded key/value caches (in-memory LRU + shared SQLite)
+"""
+import os, sqlite3, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from core.config import settings
+
+
+class MemoryCache:
+    """Per-process LRU bounded by entry count and total bytes, with optional TTL."""
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0,
+                 ttl: float | None = None):
+        self.max_entries = max_entries or settings.CACHE_MAX_ENTRIES
+        self.max_bytes   = max_bytes or settings.CACHE_MAX_BYTES
+        self.ttl         = settings.CACHE_TTL if ttl is None else ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._bytes = 0
+        self._lock  = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires and expires < time.time():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        expires = time.time() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (expires, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= len(value.encode())
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "backend":   "memory",
+            "entries":   len(self._data),
+            "bytes":     self._bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """On-disk LRU shared by every worker process that points at the same file.
+    Entries live in one table, partitioned by namespace. Each process tracks
+    the namespace's size as it writes and recounts every RECOUNT_EVERY writes
+    (to see other workers' entries), so an insert does not scan the table."""
+
+    RECOUNT_EVERY = 256
+
+    def __init__(self, namespace: str, path: Path | str = "", max_entries: int = 0,
+                 max_bytes: int = 0, ttl: float | None = None):
+        self.namespace   = namespace
+        self.path        = str(path or settings.CACHE_DB_PATH)
+        self.max_entries = max_entries or settings.CACHE_MAX_ENTRIES
+        self.max_bytes   = max_bytes or settings.CACHE_MAX_BYTES
+        self.ttl         = settings.CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid  = 0
+        self._count: int | None = None     # entries/bytes as last counted
+        self._size   = 0
+        self._writes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so reopen in each new process
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " ns TEXT, key TEXT, value TEXT, size INTEGER,"
+                " expires REAL, used REAL, PRIMARY KEY (ns, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (ns, used)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            db  = self._db()
+            row = db.execute("SELECT value, expires FROM cache WHERE ns=? AND key=?",
+                             (self.namespace, key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires = row
+            if expires and expires < now:
+                db.execute("DELETE FROM cache WHERE ns=? AND key=?", (self.namespace, key))
+                self._count  = None
+                self.misses += 1
+                return None
+            db.execute("UPDATE cache SET used=? WHERE ns=? AND key=?",
+                       (now, self.namespace, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        now     = time.time()
+        expires = now + self.ttl if self.ttl else 0.0
+        with self._lock:
+            db = self._db()
+            if self._count is None or self._writes % self.RECOUNT_EVERY == 0:
+                self._recount(db)
+            old = db.execute("SELECT size FROM cache WHERE ns=? AND key=?",
+                             (self.namespace, key)).fetchone()
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?,?,?,?,?,?)",
+                       (self.namespace, key, value, size, expires, now))
+            self._writes += 1
+            self._count  += old is None
+            self._size   += size - (old[0] if old else 0)
+            if self._count > self.max_entries or self._size > self.max_bytes:
+                self._evict(db)
+
+    def _recount(self, db: sqlite3.Connection) -> None:
+        self._count, self._size = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE ns=?",
+            (self.namespace,)).fetchone()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        victims = []
+        rows    = db.execute("SELECT key, size FROM cache WHERE ns=? ORDER BY used",
+                             (self.namespace,))
+        for key, size in rows:
+            if self._count <= self.max_entries and self._size <= self.max_bytes:
+                break
+            victims.append((self.namespace, key))
+            self._count -= 1
+            self._size  -= size
+        rows.close()
+        db.executemany("DELETE FROM cache WHERE ns=? AND key=?", victims)
+        self.evictions += len(victims)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE ns=? AND key=?", (self.namespace, key))
+            self._count = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE ns=?", (self.namespace,))
+            self._count = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM cache WHERE ns=?",
+                                      (self.namespace,)).fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE ns=?",
+                (self.namespace,)).fetchone()
+        return {
+            "backend":   "sqlite",
+            "entries":   count,
+            "bytes":     total,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TieredCache:
+    """Memory LRU in front of the shared SQLite store."""
+
+    def __init__(self, namespace: str, **kwargs):
+        self.memory = MemoryCache(**{k: v for k, v in kwargs.items() if k != "path"})
+        self.disk   = SQLiteCache(namespace, **kwargs)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    def __len__(self) -> int:
+        return len(self.disk)
+
+    def stats(self) -> dict:
+        return {"backend": "tiered", "memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def make_cache(namespace: str, backend: str = "", **kwargs):
+    """Build the cache configured by CACHE_BACKEND (memory | sqlite | tiered)."""
+    backend = backend or settings.CACHE_BACKEND
+    if backend == "memory":
+        return MemoryCache(**kwargs)
+    if backend == "sqlite":
+        return SQLiteCache(namespace, **kwargs)
+    if backend == "tiered":
+        return TieredCache(namespace, **kwargs)
+    raise ValueError(f"Unknown cache backend: {backend}")
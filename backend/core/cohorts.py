@@ -0,0 +1,131 @@
+"""
+backend/core/cohorts.py — precomputed Topic × Class × absence-band aggregate cube
+"""
+from __future__ import annotations
+from dataclasses import dataclass, asdict, replace
+from itertools import combinations
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DIMS      = ("Topic", "Class", "StudentAbsenceDays")
+ALL       = "*"                   # rolled-up dimension
+QUANTILES = (0.25, 0.5, 0.75)
+MEASURES  = ("engagement", "perf")
+
+
+@dataclass(frozen=True)
+class Cohort:
+    count:           int
+    engagement_mean: float
+    perf_mean:       float
+    engagement_q:    tuple[float, float, float]   # p25 / p50 / p75
+    perf_q:          tuple[float, float, float]
+
+    def merged(self, count: int, engagement_mean: float, perf_mean: float) -> "Cohort":
+        n = self.count + count
+        return replace(
+            self,
+            count           = n,
+            engagement_mean = self.engagement_mean + (engagement_mean - self.engagement_mean) * count / n,
+            perf_mean       = self.perf_mean + (perf_mean - self.perf_mean) * count / n,
+        )
+
+
+def _groupings(dims: tuple = DIMS):
+    """Every subset of `dims`, so rolled-up cells (e.g. per Topic only) are
+    precomputed too."""
+    for r in range(len(dims) + 1):
+        yield from combinations(dims, r)
+
+
+def _key(dims: tuple, values) -> tuple[str, str, str]:
+    values = values if isinstance(values, tuple) else (values,)
+    by_dim = dict(zip(dims, values))
+    return tuple(str(by_dim.get(d, ALL)) for d in DIMS)
+
+
+def _aggregate(df: pd.DataFrame, dims: tuple) -> dict[tuple, tuple]:
+    """→ {cell key: (count, eng mean, perf mean)} for one grouping, vectorised."""
+    if not dims:
+        return {(ALL,) * len(DIMS): (len(df), df["engagement"].mean(), df["perf"].mean())}
+    agg = df.groupby(list(dims), observed=True).agg(
+        n=("engagement", "size"), eng=("engagement", "mean"), perf=("perf", "mean"))
+    return {_key(dims, k): (int(r.n), r.eng, r.perf) for k, r in zip(agg.index, agg.itertuples())}
+
+
+class CohortCube:
+    """Counts, means and quartiles of engagement and performance for every
+    Topic × Class × StudentAbsenceDays cell and every roll-up of them, built
+    with one groupby per grouping. Lookups are a dict get; `ALL` stands for a
+    rolled-up dimension. Instances are never mutated: `merged` returns a new
+    cube, so a reader holding one always sees a consistent set of cells."""
+
+    def __init__(self, cells: dict[tuple[str, str, str], Cohort], dims: tuple = DIMS):
+        self._cells = cells
+        self.dims   = dims
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "CohortCube":
+        present = tuple(d for d in DIMS if d in df.columns)
+        df      = df[list(present)].join(df[list(MEASURES)].astype("float64"))
+        cells   = {}
+        for dims in _groupings(present):
+            means = _aggregate(df, dims)
+            if dims:
+                q = df.groupby(list(dims), observed=True)[list(MEASURES)].quantile(list(QUANTILES))
+                quants = {_key(dims, k): g for k, g in q.groupby(level=list(range(len(dims))))}
+            else:
+                quants = {(ALL,) * len(DIMS): df[list(MEASURES)].quantile(list(QUANTILES))}
+            for key, (n, eng, perf) in means.items():
+                qs = quants[key]
+                cells[key] = Cohort(
+                    count           = n,
+                    engagement_mean = float(eng),
+                    perf_mean       = float(perf),
+                    engagement_q    = tuple(float(v) for v in qs["engagement"]),
+                    perf_q          = tuple(float(v) for v in qs["perf"]),
+                )
+        return cls(cells, present)
+
+    def merged(self, batch: pd.DataFrame) -> "CohortCube":
+        """A new cube with `batch` rows folded into counts and means. Quartiles
+        stay as of the last build (new cells take the batch's own). Rows with
+        an empty Topic only count towards Topic roll-ups."""
+        # One groupby at the finest grain; roll-ups are summed from its few rows
+        fine = batch.groupby(list(self.dims), observed=True).agg(
+            n=("engagement", "size"), eng=("engagement", "sum"), perf=("perf", "sum"))
+        sums: dict[tuple, list] = {}
+        for values, r in zip(fine.index, fine.itertuples()):
+            by_dim = dict(zip(self.dims, values if isinstance(values, tuple) else (values,)))
+            for dims in _groupings(self.dims):
+                if "Topic" in dims and by_dim.get("Topic") == "":
+                    continue
+                acc = sums.setdefault(_key(dims, tuple(by_dim[d] for d in dims)), [0, 0.0, 0.0])
+                acc[0] += r.n
+                acc[1] += r.eng
+                acc[2] += r.perf
+
+        cells, fresh = dict(self._cells), None
+        for key, (n, eng, perf) in sums.items():
+            if key in cells:
+                cells[key] = cells[key].merged(n, eng / n, perf / n)
+            else:
+                if fresh is None:
+                    fresh = CohortCube.build(batch)
+                cells[key] = fresh.get(*key)
+        return CohortCube(cells, self.dims)
+
+    def get(self, topic: str = ALL, cls: str = ALL, absence: str = ALL) -> Optional[Cohort]:
+        return self._cells.get((topic, cls, absence))
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def row(self, topic: str = ALL, cls: str = ALL, absence: str = ALL) -> Optional[dict]:
+        cell = self.get(topic, cls, absence)
+        return None if cell is None else {"topic": topic, "class": cls, "absence": absence, **asdict(cell)}
+
+    def rows(self) -> list[dict]:
+        return [self.row(*key) for key in sorted(self._cells)]
@@ -0,0 +1,131 @@
+"""
+backend/core/columnar.py — typed CSV reader + memory-mapped .npy column cache for xAPI exports
+"""
+from __future__ import annotations
+import json, os, shutil, uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+import numpy as np
+from core.config import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Only the columns the analyser uses, with the smallest dtypes that hold them
+COLUMNS = {
+    "Topic":              "category",
+    "Class":              "category",
+    "StudentAbsenceDays": "category",
+    "raisedhands":        "int16",
+    "VisITedResources":   "int16",
+    "Discussion":         "int16",
+}
+
+
+def read_typed_csv(path: Path | str) -> pd.DataFrame:
+    """`pd.read_csv` restricted to COLUMNS, parsed straight into compact dtypes.
+    Counters are read as nullable Int16 so a blank cell counts as 0 instead of
+    failing the whole file."""
+    import pandas as pd
+    header  = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in COLUMNS if c in header]
+    dtypes  = {c: "Int16" if COLUMNS[c] == "int16" else COLUMNS[c] for c in usecols}
+    df      = pd.read_csv(path, usecols=usecols, dtype=dtypes)
+    for c in usecols:
+        if COLUMNS[c] == "int16":
+            df[c] = df[c].fillna(0).astype("int16")
+    return df
+
+
+def _categorical(codes: np.ndarray, categories: list):
+    """Categorical backed by the mapped `codes` themselves. They are saved in
+    the dtype pandas uses for these categories, so nothing is converted, and
+    were range-checked at build time, so they are not scanned again."""
+    import pandas as pd
+    dtype = pd.CategoricalDtype(categories)
+    try:
+        return pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+    except TypeError:                   # pandas < 2.1 always validates
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+
+
+class ColumnarCache:
+    """One .npy file per column (category codes for categoricals) plus a
+    meta.json, keyed by the source file's path, size and mtime:
+
+        data/dataset_cache/<source-stem>/<column>.npy
+
+    Columns are opened with mmap_mode="r", so every worker process maps the
+    same page-cache pages instead of holding its own parsed copy. The
+    directory is built under a temp name and renamed into place."""
+
+    def __init__(self, root: Path | str = ""):
+        self.root = Path(root or settings.DATASET_CACHE_DIR)
+
+    def _dir(self, source: Path) -> Path:
+        return self.root / source.stem
+
+    @staticmethod
+    def _stamp(source: Path) -> dict:
+        st = source.stat()
+        return {"source": str(source.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def load(self, source: Path | str) -> Optional[pd.DataFrame]:
+        """Memory-mapped frame, or None if missing, unreadable or built from
+        another file version (the caller then rebuilds it from the CSV)."""
+        import pandas as pd
+        source, d = Path(source), self._dir(Path(source))
+        if not (d / "meta.json").exists():
+            return None
+        stamp = self._stamp(source)
+        try:
+            meta = json.loads((d / "meta.json").read_text())
+            if meta.get("stamp") != stamp:
+                return None
+            cols = {}
+            for name, spec in meta["columns"].items():
+                arr = np.load(d / f"{name}.npy", mmap_mode="r")
+                if len(arr) != meta["rows"]:
+                    raise ValueError(f"{name}.npy has {len(arr)} rows, expected {meta['rows']}")
+                cols[name] = _categorical(arr, spec["categories"]) if "categories" in spec else arr
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Columnar dataset cache {d} unreadable ({e}); rebuilding from {source.name}")
+            return None
+        return pd.DataFrame(cols, copy=False)
+
+    def build(self, source: Path | str, df: pd.DataFrame) -> Path:
+        import pandas as pd
+        source = Path(source)
+        final  = self._dir(source)
+        tmp    = final.with_name(f"{final.name}.{uuid.uuid4().hex}.tmp")
+        tmp.mkdir(parents=True)
+        columns = {}
+        for name in df.columns:
+            s = df[name]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                np.save(tmp / f"{name}.npy", s.cat.codes.to_numpy())
+                columns[name] = {"categories": [str(c) for c in s.cat.categories]}
+            else:
+                np.save(tmp / f"{name}.npy", s.to_numpy())
+                columns[name] = {}
+        (tmp / "meta.json").write_text(json.dumps(
+            {"stamp": self._stamp(source), "rows": len(df), "columns": columns}))
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        return final
+
+
+def load_columnar(source: Path | str, cache: Optional[ColumnarCache] = None) -> pd.DataFrame:
+    """Mapped columns if the cache is current, else parse the CSV once and
+    (re)build the cache. A read-only cache dir just means no cache."""
+    cache = cache or ColumnarCache()
+    if (df := cache.load(source)) is not None:
+        return df
+    df = read_typed_csv(source)
+    try:
+        cache.build(source, df)
+    except OSError as e:
+        print(f"⚠️  Columnar dataset cache not written: {e}")
+        return df
+    mapped = cache.load(source)
+    return df if mapped is None else mapped
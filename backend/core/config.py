@@ -6,6 +6,17 @@ from pathlib import Path
 
 ROOT = Path(__file__).parent.parent
 
+# Web worker processes (uvicorn/gunicorn read the same variable)
+WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def _per_worker(name: str, default: str) -> int:
+    """A provider quota is shared by every worker, but each process paces
+    itself on its own, so it gets an equal share (0 stays unlimited)."""
+    total = int(os.getenv(name, default))
+    return max(1, total // WEB_WORKERS) if total else 0
+
+
 class Settings:
     # ── LLM ─────────────────────────────────────────────
     GROQ_API_KEY        = os.getenv("GROQ_API_KEY", "")
@@ -15,10 +26,14 @@ class Settings:
     MODEL_FALLBACK      = "deepseek/deepseek-r1"
 
     # ── Paths ────────────────────────────────────────────
-    DATA_DIR        = ROOT / "data"
-    DATASET_PATH    = DATA_DIR / "xAPI-Edu-Data.csv"
-    MOCK_PDF_DIR    = DATA_DIR / "mock_pdfs"
-    UPLOAD_DIR      = DATA_DIR / "uploads"
+    DATA_DIR          = ROOT / "data"
+    DATASET_PATH      = Path(os.getenv("DATASET_PATH", DATA_DIR / "xAPI-Edu-Data.csv"))
+    DATASET_CACHE_DIR = Path(os.getenv("DATASET_CACHE_DIR", DATA_DIR / "dataset_cache"))
+    MOCK_PDF_DIR      = DATA_DIR / "mock_pdfs"
+    UPLOAD_DIR        = DATA_DIR / "uploads"
+    CACHE_DB_PATH     = DATA_DIR / "cache.sqlite3"
+    JOBS_DB_PATH      = Path(os.getenv("JOBS_DB_PATH", DATA_DIR / "jobs.sqlite3"))
+    TOPIC_STORE_DIR   = Path(os.getenv("TOPIC_STORE_DIR", DATA_DIR / "topic_store"))
 
     # ── API ──────────────────────────────────────────────
     API_HOST        = os.getenv("API_HOST", "0.0.0.0")
@@ -32,10 +47,94 @@ class Settings:
     TEMPERATURE = 0.7
     MAX_TOKENS  = 2048
 
+    # ── Concurrency (max in-flight calls per provider) ──
+    GROQ_CONCURRENCY       = int(os.getenv("GROQ_CONCURRENCY", "8"))
+    OPENROUTER_CONCURRENCY = int(os.getenv("OPENROUTER_CONCURRENCY", "4"))
+
+    # ── Provider rate limits (0 = unlimited) ────────────
+    # Account-wide quotas, split evenly across WEB_CONCURRENCY processes
+    WEB_WORKERS    = WEB_WORKERS
+    GROQ_RPM       = _per_worker("GROQ_RPM", "30")             # requests per minute
+    GROQ_TPM       = _per_worker("GROQ_TPM", "12000")          # tokens per minute
+    OPENROUTER_RPM = _per_worker("OPENROUTER_RPM", "20")
+    OPENROUTER_TPM = _per_worker("OPENROUTER_TPM", "0")
+
+    # ── Retries (429 / 5xx / timeouts) ──────────────────
+    LLM_MAX_RETRIES  = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))    # seconds, doubled per retry
+    LLM_BACKOFF_CAP  = float(os.getenv("LLM_BACKOFF_CAP", "30"))    # max seconds between retries
+
+    # ── HTTP client shared by the LLM providers ─────────
+    HTTP_POOL_SIZE        = int(os.getenv("HTTP_POOL_SIZE", "20"))            # max open connections
+    HTTP_KEEPALIVE        = int(os.getenv("HTTP_KEEPALIVE", "10"))            # idle connections kept warm
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))   # seconds before idle close
+    HTTP_CONNECT_TIMEOUT  = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT     = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    HTTP2                 = os.getenv("HTTP2", "1") == "1"                    # needs the h2 package
+
+    # ── Provider routing / failover ─────────────────────
+    ROUTER_WINDOW         = int(os.getenv("ROUTER_WINDOW", "100"))           # recent calls tracked per provider
+    ROUTER_MIN_SAMPLES    = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))       # before p95 / error rate count
+    ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5")) # mark provider down above this
+    ROUTER_COOLDOWN       = float(os.getenv("ROUTER_COOLDOWN", "30"))        # seconds a provider stays down
+    ROUTER_HEDGE          = os.getenv("ROUTER_HEDGE", "0") == "1"            # duplicate calls slower than p95
+
+    # ── Grading ─────────────────────────────────────────
+    GRADING_BATCH_SIZE      = int(os.getenv("GRADING_BATCH_SIZE", "1"))        # questions per prompt, 1 = off
+    GRADING_BATCH_TOKENS    = int(os.getenv("GRADING_BATCH_TOKENS", "3000"))   # answer tokens per batch prompt
+    GRADE_BATCH_MAX_SCRIPTS = int(os.getenv("GRADE_BATCH_MAX_SCRIPTS", "200")) # scripts per /api/grade/batch
+    GRADE_CLASS_CONCURRENCY = int(os.getenv("GRADE_CLASS_CONCURRENCY", "4"))   # students in flight per batch
+
+    # ── Uploads ─────────────────────────────────────────
+    UPLOAD_MAX_BYTES       = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))         # per file
+    UPLOAD_MAX_TOTAL_BYTES = int(os.getenv("UPLOAD_MAX_TOTAL_BYTES", str(50 * 1024 * 1024)))   # per request
+    UPLOAD_SPOOL_BYTES     = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))        # larger → left on disk
+
+    # ── OCR ─────────────────────────────────────────────
+    OCR_WARMUP    = os.getenv("OCR_WARMUP", "0") == "1"        # load a reader per worker at startup
+    OCR_WORKERS   = int(os.getenv("OCR_WORKERS", "2"))        # OCR processes, ~1 GB each with easyocr
+
+    # ── Startup ─────────────────────────────────────────
+    STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"   # build dataset, LLM clients, agents before serving
+
+    # ── Dataset loading ─────────────────────────────────
+    DATASET_COLUMNAR         = os.getenv("DATASET_COLUMNAR", "1") == "1"       # mmap .npy cache instead of parsing CSV
+    DATASET_EVENTS_MAX_BATCH = int(os.getenv("DATASET_EVENTS_MAX_BATCH", "10000"))   # per /api/dataset/events
+    COHORT_MIN_COUNT         = int(os.getenv("COHORT_MIN_COUNT", "10"))          # records before a topic baseline is used
+
+    # ── Learn-mode topic store (see warmup.py) ──────────
+    TOPIC_WARMUP             = os.getenv("TOPIC_WARMUP", "0") == "1"        # fill missing topics at startup
+    TOPIC_WARMUP_CONCURRENCY = int(os.getenv("TOPIC_WARMUP_CONCURRENCY", "4"))
+    TOPIC_STORE_SERVE_STALE  = os.getenv("TOPIC_STORE_SERVE_STALE", "1") == "1"   # old version until refreshed
+
+    # ── Background jobs ─────────────────────────────────
+    JOB_CONCURRENCY  = int(os.getenv("JOB_CONCURRENCY", "2"))     # workers per process
+    JOB_QUEUE_DEPTH  = int(os.getenv("JOB_QUEUE_DEPTH", "100"))   # queued+running before 429
+    JOB_HEARTBEAT    = float(os.getenv("JOB_HEARTBEAT", "5"))     # seconds
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))    # claims before a crashing job fails
+    JOB_TTL          = float(os.getenv("JOB_TTL", "86400"))       # seconds finished jobs are kept
+    MOCK_PENDING_TTL = float(os.getenv("MOCK_PENDING_TTL", str(7 * 86400)))  # unrendered mock PDFs kept
+
+    # ── Response cache (memory | sqlite | tiered) ───────
+    CACHE_BACKEND     = os.getenv("CACHE_BACKEND", "tiered")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+    CACHE_MAX_BYTES   = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_TTL         = int(os.getenv("CACHE_TTL", str(7 * 24 * 3600)))   # seconds, 0 = never
+
+    # ── Semantic cache (near-duplicate prompts) ─────────
+    # Namespaces that may reuse answers to similar requests: plan, content, questions, analysis.
+    # "analysis" is opt-in: a wrong hit serves another paper's analysis and mock paper
+    SEMANTIC_NAMESPACES  = [n for n in os.getenv("SEMANTIC_NAMESPACES", "plan,content,questions").split(",") if n]
+    SEMANTIC_THRESHOLD   = float(os.getenv("SEMANTIC_THRESHOLD", "0.92"))   # cosine similarity for a hit
+    SEMANTIC_ANALYSIS_THRESHOLD = float(os.getenv("SEMANTIC_ANALYSIS_THRESHOLD", "0.95"))   # on question text only
+    SEMANTIC_MAX_ENTRIES = int(os.getenv("SEMANTIC_MAX_ENTRIES", "2000"))   # per namespace
+    SEMANTIC_DIM         = int(os.getenv("SEMANTIC_DIM", "2048"))           # hashed feature dimensions
+
     @classmethod
     def setup(cls):
+        """Create the data directories. Called at startup and before writing
+        into them, not on import."""
         for d in [cls.DATA_DIR, cls.MOCK_PDF_DIR, cls.UPLOAD_DIR]:
             d.mkdir(parents=True, exist_ok=True)
 
 settings = Settings()
-settings.setup()
@@ -1,18 +1,71 @@
 """
 backend/core/dataset.py — xAPI-Edu-Data analyser (480 real student records)
 """
+from __future__ import annotations
+import threading
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING
 import numpy as np
-import pandas as pd
 from core.config import settings
+from core.columnar import load_columnar, read_typed_csv
+from core.cohorts import CohortCube
+from core.lazy import Lazy
 
+if TYPE_CHECKING:
+    import pandas as pd     # imported on first load, not with the module
+
+PERF_BY_CLASS  = {"L": 0.40, "M": 0.70, "H": 0.95}
+EVENT_COUNTERS = ("raised_hands", "visited_resources", "discussion")   # raisedhands, VisITedResources, Discussion
+
+
+class RunningStats:
+    """Count / mean / variance folded in batch by batch (Welford, with the
+    Chan et al. merge for whole batches) — new rows never rescan old ones."""
 
-class DatasetAnalyzer:
     def __init__(self):
-        self.df = self._load()
-        self.n  = len(self.df)
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def update(self, values) -> None:
+        x = np.asarray(values, dtype=np.float64).ravel()
+        x = x[~np.isnan(x)]
+        if not x.size:
+            return
+        n_b, mean_b = x.size, float(x.mean())
+        n     = self.count + n_b
+        delta = mean_b - self.mean
+        self.m2   += float(((x - mean_b) ** 2).sum()) + delta * delta * self.count * n_b / n
+        self.mean += delta * n_b / n
+        self.count = n
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """Aggregates as of the last load or ingest; readers never touch the frame."""
+    total_records:       int
+    avg_engagement:      float
+    engagement_std:      float
+    avg_performance:     float
+    high_performers_pct: float
+    low_performers_pct:  float
+    baseline_accuracy:   float
+    ingested_events:     int = 0
+
+
+class DatasetAnalyzer:
+    def __init__(self, df: pd.DataFrame | None = None):
+        self.df = self._load() if df is None else df
         self._prepare()
         print(f"✅ Dataset → {self.n} student records")
 
+    @property
+    def n(self) -> int:
+        return self.snapshot.total_records
+
     def _load(self) -> pd.DataFrame:
         paths = [
             settings.DATASET_PATH,
@@ -21,10 +74,14 @@ class DatasetAnalyzer:
         ]
         for p in paths:
             try:
-                return pd.read_csv(p)
+                return load_columnar(p) if settings.DATASET_COLUMNAR else read_typed_csv(p)
             except FileNotFoundError:
                 continue
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Dataset {p} unreadable ({e})")
+                continue
         print("⚠️  Using synthetic dataset")
+        import pandas as pd
         rng = np.random.default_rng(42)
         return pd.DataFrame({
             "Topic":              ["IT","Math","Science","English"] * 120,
@@ -36,29 +93,99 @@ class DatasetAnalyzer:
         })
 
     def _prepare(self):
+        # float first: the counters are int16 and their sum could overflow
         self.df["engagement"] = (
-            self.df["raisedhands"] + self.df["VisITedResources"] + self.df["Discussion"]
+            self.df["raisedhands"].astype("float32")
+            + self.df["VisITedResources"] + self.df["Discussion"]
         ) / 3
-        self.df["perf"] = self.df["Class"].map({"L":0.40,"M":0.70,"H":0.95})
+        self.df["perf"] = self.df["Class"].map(PERF_BY_CLASS).astype("float32")
+
+        self._lock     = threading.Lock()
+        self._rows     = 0
+        self._eng      = RunningStats()
+        self._perf     = RunningStats()
+        self._classes: Counter = Counter()
+        self._ingested = 0
+        self._absorb(self.df["engagement"], self.df["perf"], self.df["Class"])
+        self._publish()
+        self.cube = CohortCube.build(self.df)
+
+    # ── Running statistics ──────────────────────────────
+    def _absorb(self, engagement, perf, classes) -> None:
+        import pandas as pd
+        self._rows += len(engagement)
+        self._eng.update(engagement)
+        self._perf.update(perf)
+        self._classes.update(pd.Series(classes).value_counts().to_dict())
+
+    def _publish(self) -> None:
+        rows = self._rows or 1
+        # One reference assignment: readers see the old snapshot or the new one
+        self.snapshot = DatasetSnapshot(
+            total_records       = self._rows,
+            avg_engagement      = self._eng.mean,
+            engagement_std      = self._eng.std,
+            avg_performance     = self._perf.mean,
+            high_performers_pct = self._classes["H"] / rows * 100,
+            low_performers_pct  = self._classes["L"] / rows * 100,
+            baseline_accuracy   = round(self._perf.mean * 100, 2),
+            ingested_events     = self._ingested,
+        )
+
+    def ingest(self, events: list[dict]) -> DatasetSnapshot:
+        """Fold a batch of engagement events into the running statistics and
+        publish a new snapshot, without reloading the frame."""
+        if not events:
+            return self.snapshot
+        import pandas as pd
+        counts  = np.array([[e.get(f) or 0 for f in EVENT_COUNTERS] for e in events], dtype=np.float64)
+        classes = [e.get("performance_class") for e in events]
+        batch   = pd.DataFrame({
+            "Topic":              [e.get("topic") or "" for e in events],
+            "Class":              classes,
+            "StudentAbsenceDays": [e.get("absence_days") or "Under-7" for e in events],
+            "engagement":         counts.mean(axis=1),
+            "perf":               [PERF_BY_CLASS.get(c, np.nan) for c in classes],
+        })
+        with self._lock:
+            self._absorb(batch["engagement"], batch["perf"], classes)
+            self._ingested += len(events)
+            self._publish()
+            self.cube = self.cube.merged(batch)
+            return self.snapshot
 
     def baseline_accuracy(self) -> float:
-        return round(float(self.df["perf"].mean()) * 100, 2)
+        return self.snapshot.baseline_accuracy
+
+    def baseline(self, topic: str = "") -> tuple[float, float]:
+        """(avg engagement, avg performance) of `topic`'s cohort, or of the
+        whole dataset when the topic has fewer than COHORT_MIN_COUNT records."""
+        cell = self.cube.get(topic) if topic else None
+        if cell is not None and cell.count >= settings.COHORT_MIN_COUNT:
+            return cell.engagement_mean, cell.perf_mean
+        snap = self.snapshot
+        return snap.avg_engagement, snap.avg_performance
 
-    def compute_mastery(self, engagement: float) -> float:
-        avg_eng  = float(self.df["engagement"].mean())
-        avg_perf = float(self.df["perf"].mean())
-        ratio    = engagement / avg_eng if avg_eng > 0 else 1.0
-        return round(min(0.98, avg_perf * (0.80 + 0.20 * ratio)), 3)
+    def compute_mastery(self, engagement: float | np.ndarray, topic: str = "") -> float | np.ndarray:
+        """Scalar in, float out; an array of engagement values is scored in
+        one vectorised pass and comes back as an array of the same shape.
+        With `topic`, engagement is compared against that topic's cohort."""
+        avg_eng, avg_perf = self.baseline(topic)
+        eng   = np.asarray(engagement, dtype=np.float64)
+        ratio = eng / avg_eng if avg_eng > 0 else np.ones_like(eng)
+        out   = np.round(np.minimum(0.98, avg_perf * (0.80 + 0.20 * ratio)), 3)
+        return float(out) if out.ndim == 0 else out
 
     def summary(self) -> dict:
+        s = asdict(self.snapshot)
         return {
-            "total_records":       self.n,
-            "avg_engagement":      round(float(self.df["engagement"].mean()), 2),
-            "avg_performance":     round(float(self.df["perf"].mean()), 3),
-            "high_performers_pct": round(float((self.df["Class"]=="H").mean()*100), 1),
-            "low_performers_pct":  round(float((self.df["Class"]=="L").mean()*100), 1),
-            "baseline_accuracy":   self.baseline_accuracy(),
+            **s,
+            "avg_engagement":      round(s["avg_engagement"], 2),
+            "engagement_std":      round(s["engagement_std"], 2),
+            "avg_performance":     round(s["avg_performance"], 3),
+            "high_performers_pct": round(s["high_performers_pct"], 1),
+            "low_performers_pct":  round(s["low_performers_pct"], 1),
         }
 
 
-dataset = DatasetAnalyzer()
+dataset = Lazy(DatasetAnalyzer)
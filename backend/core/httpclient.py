@@ -0,0 +1,124 @@
+"""
+backend/core/httpclient.py — shared, tunable HTTP clients for the LLM providers
+"""
+import importlib.util, threading
+import httpx
+from core.config import settings
+
+
+class ConnectionStats:
+    """Counts requests and newly opened connections via httpcore's `trace`
+    extension; every request that didn't open a connection reused one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = self.connections = self.tls_handshakes = 0
+
+    def on_event(self, name: str, info: dict) -> None:
+        with self._lock:
+            if name == "connection.connect_tcp.complete":
+                self.connections += 1
+            elif name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            elif name.endswith("send_request_headers.started"):
+                self.requests += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests":        self.requests,
+            "new_connections": self.connections,
+            "reused":          max(0, self.requests - self.connections),
+            "tls_handshakes":  self.tls_handshakes,
+        }
+
+
+class HTTPClients:
+    """One sync and one async httpx client for the whole process, so provider
+    calls share warm keep-alive connections instead of paying a TLS handshake
+    each. Built lazily from Settings; `aclose` on shutdown."""
+
+    def __init__(self):
+        self._sync: httpx.Client | None = None
+        self._async: httpx.AsyncClient | None = None
+        self._lock = threading.Lock()
+        self.conn  = ConnectionStats()
+        self._http2: bool | None = None
+
+    @property
+    def http2(self) -> bool:
+        """HTTP2 setting, checked against the h2 package when first needed."""
+        if self._http2 is None:
+            self._http2 = settings.HTTP2 and importlib.util.find_spec("h2") is not None
+            if settings.HTTP2 and not self._http2:
+                print("⚠️  HTTP2=1 but the h2 package is missing; using HTTP/1.1")
+        return self._http2
+
+    def _options(self) -> dict:
+        return {
+            "http2":   self.http2,
+            "timeout": httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            "limits":  httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    # ── Tracing hooks ────────────────────────────────────
+    def _trace(self, name: str, info: dict) -> None:
+        self.conn.on_event(name, info)
+
+    async def _atrace(self, name: str, info: dict) -> None:
+        self.conn.on_event(name, info)
+
+    def _hook(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+
+    async def _ahook(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._atrace
+
+    # ── Clients ──────────────────────────────────────────
+    @property
+    def sync(self) -> httpx.Client:
+        with self._lock:
+            if self._sync is None:
+                self._sync = httpx.Client(**self._options(), event_hooks={"request": [self._hook]})
+            return self._sync
+
+    @property
+    def async_(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async is None:
+                self._async = httpx.AsyncClient(**self._options(), event_hooks={"request": [self._ahook]})
+            return self._async
+
+    def kwargs_for(self, chat_cls) -> dict:
+        """`http_client` / `http_async_client` kwargs for a langchain chat model,
+        or {} when the class can't take both (it would hand the sync client to
+        its async SDK)."""
+        fields = getattr(chat_cls, "model_fields", None) or getattr(chat_cls, "__fields__", {})
+        if "http_client" not in fields or "http_async_client" not in fields:
+            print(f"⚠️  {chat_cls.__name__} can't take shared HTTP clients; using its defaults")
+            return {}
+        return {"http_client": self.sync, "http_async_client": self.async_}
+
+    async def aclose(self) -> None:
+        if self._async is not None:
+            await self._async.aclose()
+            self._async = None
+        if self._sync is not None:
+            self._sync.close()
+            self._sync = None
+
+    def stats(self) -> dict:
+        return {
+            "http2":        self.http2,
+            "pool_size":    settings.HTTP_POOL_SIZE,
+            "keepalive":    settings.HTTP_KEEPALIVE,
+            "sync_open":    self._sync is not None,
+            "async_open":   self._async is not None,
+            **self.conn.stats(),
+        }
+
+
+http_clients = HTTPClients()
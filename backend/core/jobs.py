@@ -0,0 +1,236 @@
+"""
+backend/core/jobs.py — SQLite-backed background job queue with a bounded worker pool
+"""
+import asyncio, json, os, sqlite3, threading, time, uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+from core.config import settings
+
+TERMINAL = ("done", "failed")
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class JobQueue:
+    """Jobs are rows in a local SQLite file, so a queued or half-finished job
+    survives a worker crash: rows whose heartbeat goes stale are re-queued, up
+    to JOB_MAX_ATTEMPTS claims, then failed. Finished jobs are deleted JOB_TTL
+    seconds after they end. `concurrency` asyncio workers per process drain
+    the queue; `submit` refuses new work once `max_depth` jobs are waiting or
+    running. SQLite calls made from the event loop run in a thread."""
+
+    def __init__(self, path: Path | str = "", concurrency: int = 0, max_depth: int = 0):
+        self.path         = str(path or settings.JOBS_DB_PATH)
+        self.concurrency  = concurrency or settings.JOB_CONCURRENCY
+        self.max_depth    = max_depth or settings.JOB_QUEUE_DEPTH
+        self.heartbeat    = settings.JOB_HEARTBEAT
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS
+        self.ttl          = settings.JOB_TTL
+        self._handlers: dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self._chores: list[Callable[[], Any]] = []
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid  = 0
+
+    # ── Storage ──────────────────────────────────────────
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT, payload TEXT, status TEXT,"
+                " result TEXT, error TEXT, attempts INTEGER DEFAULT 0,"
+                " created REAL, updated REAL, heartbeat REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _exec(self, sql: str, args: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db().execute(sql, args).fetchall()
+
+    def _update(self, sql: str, args: tuple = ()) -> int:
+        with self._lock:
+            return self._db().execute(sql, args).rowcount
+
+    # ── Public API ───────────────────────────────────────
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[Any]]) -> None:
+        self._handlers[kind] = handler
+
+    def on_housekeep(self, chore: Callable[[], Any]) -> None:
+        """Also run `chore` (sync, in a thread) on every prune pass."""
+        self._chores.append(chore)
+
+    def depth(self) -> int:
+        return self._exec("SELECT COUNT(*) FROM jobs WHERE status IN ('queued','running')")[0][0]
+
+    def _insert(self, kind: str, payload: dict) -> str:
+        if self.depth() >= self.max_depth:
+            raise QueueFull(f"Job queue is full ({self.max_depth} pending)")
+        job_id = str(uuid.uuid4())
+        now    = time.time()
+        self._exec("INSERT INTO jobs (id, kind, payload, status, created, updated)"
+                   " VALUES (?,?,?,?,?,?)",
+                   (job_id, kind, json.dumps(payload), "queued", now, now))
+        return job_id
+
+    async def submit(self, kind: str, payload: dict) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        job_id = await asyncio.to_thread(self._insert, kind, payload)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        rows = self._exec("SELECT * FROM jobs WHERE id=?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "job_id":   row["id"],
+            "kind":     row["kind"],
+            "status":   row["status"],
+            "result":   json.loads(row["result"]) if row["result"] else None,
+            "error":    row["error"],
+            "attempts": row["attempts"],
+            "created":  row["created"],
+            "updated":  row["updated"],
+        }
+
+    async def watch(self, job_id: str, interval: float = 0.25):
+        """Yield the job each time its status changes, until it finishes.
+        Polls the table, so it also sees jobs run by other worker processes."""
+        last = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job["status"] != last:
+                last = job["status"]
+                yield job
+            if last in TERMINAL:
+                return
+            await asyncio.sleep(interval)
+
+    async def stats(self) -> dict:
+        return await asyncio.to_thread(self._stats)
+
+    def _stats(self) -> dict:
+        rows = self._exec("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {
+            "concurrency": self.concurrency,
+            "max_depth":   self.max_depth,
+            **{status: n for status, n in rows},
+        }
+
+    # ── Workers ──────────────────────────────────────────
+    def start(self) -> None:
+        """Start the workers on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and any(not w.done() for w in self._workers):
+            return
+        self._loop    = loop
+        self._wake    = asyncio.Event()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def recover(self) -> int:
+        """Re-queue jobs whose worker stopped heart-beating (crashed process)."""
+        stale = time.time() - 3 * self.heartbeat
+        self._update("UPDATE jobs SET status='failed', error='Worker crashed too many times',"
+                     " updated=? WHERE status='running' AND heartbeat<? AND attempts>=?",
+                     (time.time(), stale, self.max_attempts))
+        return self._update("UPDATE jobs SET status='queued', updated=?"
+                            " WHERE status='running' AND heartbeat<?", (time.time(), stale))
+
+    def prune(self) -> int:
+        """Delete finished jobs older than `ttl` seconds (0 keeps them forever)."""
+        if not self.ttl:
+            return 0
+        return self._update("DELETE FROM jobs WHERE status IN ('done','failed') AND updated<?",
+                            (time.time() - self.ttl,))
+
+    def _housekeep(self) -> None:
+        self.recover()
+        self.prune()
+        for chore in self._chores:
+            try:
+                chore()
+            except Exception as e:
+                print(f"⚠️  Housekeeping {getattr(chore, '__name__', chore)} failed: {e}")
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT * FROM jobs WHERE status='queued'"
+                                 " ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET status='running', attempts=attempts+1,"
+                               " heartbeat=?, updated=? WHERE id=?", (now, now, row["id"]))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row
+
+    async def _beat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await asyncio.to_thread(self._exec, "UPDATE jobs SET heartbeat=? WHERE id=?",
+                                    (time.time(), job_id))
+
+    async def _worker(self) -> None:
+        await asyncio.to_thread(self._housekeep)
+        while True:
+            self._wake.clear()
+            row = await asyncio.to_thread(self._claim)
+            if row is None:
+                try:
+                    # Also re-check periodically for jobs submitted by other processes
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._housekeep)
+                continue
+
+            beat = asyncio.create_task(self._beat(row["id"]))
+            try:
+                handler = self._handlers[row["kind"]]
+                result  = await handler(json.loads(row["payload"]))
+                await asyncio.to_thread(
+                    self._exec, "UPDATE jobs SET status='done', result=?, updated=? WHERE id=?",
+                    (json.dumps(result), time.time(), row["id"]))
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back for the next worker
+                self._exec("UPDATE jobs SET status='queued', updated=? WHERE id=?",
+                           (time.time(), row["id"]))
+                raise
+            except Exception as e:
+                await asyncio.to_thread(
+                    self._exec, "UPDATE jobs SET status='failed', error=?, updated=? WHERE id=?",
+                    (str(e), time.time(), row["id"]))
+            finally:
+                beat.cancel()
+
+
+jobs = JobQueue()
@@ -0,0 +1,57 @@
+"""
+backend/core/lazy.py — module-level singletons built on first use
+"""
+import threading
+from typing import Any, Callable
+
+_UNSET = object()
+
+
+class Lazy:
+    """Stands in for a singleton and builds it with `factory` on first
+    attribute access (reads and writes, so monkeypatching works too). Safe
+    to hit from several threads at once: the factory runs exactly once.
+    isinstance() sees the real class."""
+
+    __slots__ = ("_lazy_factory", "_lazy_target", "_lazy_lock")
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_target", _UNSET)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+
+    def _lazy_get(self) -> Any:
+        if self._lazy_target is _UNSET:
+            with self._lazy_lock:
+                if self._lazy_target is _UNSET:
+                    object.__setattr__(self, "_lazy_target", self._lazy_factory())
+        return self._lazy_target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._lazy_get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._lazy_get(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._lazy_get(), name)
+
+    @property
+    def __class__(self):
+        return type(self._lazy_get())
+
+    def __repr__(self) -> str:
+        if self._lazy_target is _UNSET:
+            return f"<Lazy {getattr(self._lazy_factory, '__name__', 'object')} (not built)>"
+        return repr(self._lazy_target)
+
+
+def is_loaded(obj: Any) -> bool:
+    return type(obj) is not Lazy or obj._lazy_target is not _UNSET
+
+
+def load(*objs: Any) -> None:
+    """Build every Lazy in `objs` now (e.g. in a startup warm-up)."""
+    for obj in objs:
+        if type(obj) is Lazy:
+            obj._lazy_get()
@@ -1,69 +1,223 @@
 """
 backend/core/llm.py — LLM wrapper with Groq primary, OpenRouter fallback
 """
-import hashlib, json
+import asyncio, hashlib, json
+from contextvars import ContextVar
 from typing import Any
 from core.config import settings
+from core.cache import make_cache
+from core.httpclient import http_clients
+from core.ratelimit import RateLimiter
+from core.router import Provider, Router, answered_by
+from core.semantic import semantic_index
+from core.lazy import Lazy
+
+NOT_CONFIGURED = "[LLM not configured — set GROQ_API_KEY]"
+STREAM_REPLAY_CHUNK = 64   # chars per chunk when replaying a cached completion
+
+# Whether the current task's latest answer came from (or was cached from) the
+# primary provider. Cache keys and topic store versions name the primary's
+# model, so failover and hedge answers are kept out of both.
+_from_primary: ContextVar[bool] = ContextVar("from_primary", default=True)
 
 
 class LLM:
     def __init__(self):
-        self._llm     = None
-        self._cache: dict[str, str] = {}
-        self.provider = "uninitialised"
+        self.cache    = make_cache("llm")
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self.router   = Router([])
         self._init()
 
     def _init(self):
+        # Every provider with a key gets a client; the router fails over between them
+        providers = []
         if settings.GROQ_API_KEY:
             try:
                 from langchain_groq import ChatGroq
-                self._llm = ChatGroq(
+                client = ChatGroq(
                     model=settings.MODEL_PRIMARY,
                     temperature=settings.TEMPERATURE,
                     max_tokens=settings.MAX_TOKENS,
                     groq_api_key=settings.GROQ_API_KEY,
+                    max_retries=0,          # retries go through the router instead
+                    **http_clients.kwargs_for(ChatGroq),
                 )
-                self.provider = f"Groq/{settings.MODEL_PRIMARY}"
-                print(f"✅ LLM → {self.provider}")
-                return
+                providers.append(Provider("Groq", settings.MODEL_PRIMARY, client,
+                                          settings.GROQ_CONCURRENCY,
+                                          RateLimiter(settings.GROQ_RPM, settings.GROQ_TPM)))
             except Exception as e:
                 print(f"⚠️  Groq failed: {e}")
 
         if settings.OPENROUTER_API_KEY:
             try:
                 from langchain_openai import ChatOpenAI
-                self._llm = ChatOpenAI(
+                client = ChatOpenAI(
                     model=settings.MODEL_FALLBACK,
                     temperature=settings.TEMPERATURE,
                     max_tokens=settings.MAX_TOKENS,
                     openai_api_key=settings.OPENROUTER_API_KEY,
                     openai_api_base=settings.OPENROUTER_BASE_URL,
+                    max_retries=0,
+                    **http_clients.kwargs_for(ChatOpenAI),
                 )
-                self.provider = f"OpenRouter/{settings.MODEL_FALLBACK}"
-                print(f"✅ LLM → {self.provider}")
+                providers.append(Provider("OpenRouter", settings.MODEL_FALLBACK, client,
+                                          settings.OPENROUTER_CONCURRENCY,
+                                          RateLimiter(settings.OPENROUTER_RPM, settings.OPENROUTER_TPM)))
             except Exception as e:
                 print(f"⚠️  OpenRouter failed: {e}")
+
+        self.router = Router(providers)
+        if providers:
+            print(f"✅ LLM → {' → '.join(p.label for p in providers)}")
         else:
             print("⚠️  No API key found. Set GROQ_API_KEY in .env")
 
-    def ask(self, prompt: str, cache: bool = True) -> str:
+    # The primary (first configured) provider: its model keys the cache
+    @property
+    def _llm(self):
+        return self.router.primary.client if self.router.primary else None
+
+    @property
+    def model(self) -> str:
+        return self.router.primary.model if self.router.primary else ""
+
+    @property
+    def provider(self) -> str:
+        return self.router.primary.label if self.router.primary else "uninitialised"
+
+    def from_primary(self) -> bool:
+        """True if the latest answer in this task is the primary model's."""
+        return _from_primary.get()
+
+    def _answered(self) -> bool:
+        ok = answered_by.get() is self.router.primary
+        _from_primary.set(ok)
+        return ok
+
+    def _key(self, prompt: str) -> str:
+        # Same prompt under a different model or sampling config is a different answer
+        raw = json.dumps([self.model, settings.TEMPERATURE, settings.MAX_TOKENS, prompt])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # `semantic=(namespace, text)` lets a request reuse the answer to an
+    # earlier one whose `text` (topic, goal, paper) was nearly the same
+    def _cached(self, key: str, semantic: tuple = ()) -> str | None:
+        if (hit := self.cache.get(key)) is not None:
+            return hit
+        if semantic and (index := semantic_index(semantic[0], self.model)) is not None:
+            if match := index.match(semantic[1]):
+                hit = self.cache.get(match[0])
+                if hit is None:
+                    index.discard(match[0])
+        return hit
+
+    def _store(self, key: str, out: str, semantic: tuple = ()) -> None:
+        self.cache.set(key, out)
+        if semantic and (index := semantic_index(semantic[0], self.model)) is not None:
+            index.add(semantic[1], key)
+
+    # The cache may be SQLite: async callers look it up and fill it in a thread
+    async def _acached(self, key: str, semantic: tuple = ()) -> str | None:
+        return await asyncio.to_thread(self._cached, key, semantic)
+
+    async def _astore(self, key: str, out: str, semantic: tuple = ()) -> None:
+        await asyncio.to_thread(self._store, key, out, semantic)
+
+    def ask(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> str:
         if not self._llm:
-            return "[LLM not configured — set GROQ_API_KEY]"
-        key = hashlib.md5(prompt.encode()).hexdigest()
-        if cache and key in self._cache:
-            return self._cache[key]
+            return NOT_CONFIGURED
+        key = self._key(prompt)
+        if cache and (hit := self._cached(key, semantic)) is not None:
+            _from_primary.set(True)
+            return hit
         try:
-            from langchain.schema import HumanMessage
-            r = self._llm.invoke([HumanMessage(content=prompt)])
-            out = r.content
-            if cache:
-                self._cache[key] = out
+            out = self.router.invoke(prompt).content
+            if self._answered() and cache:
+                self._store(key, out, semantic)
             return out
         except Exception as e:
+            _from_primary.set(False)
             return f"[LLM error: {e}]"
 
-    def ask_json(self, prompt: str, cache: bool = True) -> Any:
-        raw = self.ask(prompt, cache=cache)
+    async def aask(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> str:
+        """Non-blocking `ask`: awaits the provider instead of holding the event loop.
+        Concurrent cached calls for the same key share a single provider request."""
+        if not self._llm:
+            return NOT_CONFIGURED
+        if not cache:
+            try:
+                out = (await self._ainvoke(prompt)).content
+                self._answered()
+                return out
+            except Exception as e:
+                _from_primary.set(False)
+                return f"[LLM error: {e}]"
+
+        key = self._key(prompt)
+        while True:
+            if (hit := await self._acached(key, semantic)) is not None:
+                _from_primary.set(True)
+                return hit
+            if key not in self._inflight:
+                break
+            self.coalesced += 1
+            shared = await asyncio.shield(self._inflight[key])
+            if shared is not None:
+                _from_primary.set(shared[1])
+                return shared[0]
+            # None: the caller that owned the request was cancelled; one of
+            # the waiters takes it over on the next pass
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            out = (await self._ainvoke(prompt)).content
+            if self._answered():
+                await self._astore(key, out, semantic)
+        except Exception as e:
+            out = f"[LLM error: {e}]"
+            _from_primary.set(False)
+        except BaseException:
+            # Never cancel the shared future: that would cancel every waiter too
+            fut.set_result(None)
+            raise
+        finally:
+            del self._inflight[key]
+        fut.set_result((out, _from_primary.get()))
+        return out
+
+    async def stream(self, prompt: str, cache: bool = True, semantic: tuple = ()):
+        """Async iterator over completion chunks as the provider emits them.
+        A cache hit is replayed in chunks so callers have a single code path."""
+        if not self._llm:
+            yield NOT_CONFIGURED
+            return
+        key = self._key(prompt)
+        if cache and (hit := await self._acached(key, semantic)) is not None:
+            _from_primary.set(True)
+            for i in range(0, len(hit), STREAM_REPLAY_CHUNK):
+                yield hit[i:i + STREAM_REPLAY_CHUNK]
+            return
+
+        parts = []
+        try:
+            async for chunk in self.router.astream(prompt):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            _from_primary.set(False)
+            yield f"[LLM error: {e}]"
+            return
+        # Only a completion that was read to the end is worth caching
+        if self._answered() and cache:
+            await self._astore(key, "".join(parts), semantic)
+
+    async def _ainvoke(self, prompt: str):
+        return await self.router.ainvoke(prompt)
+
+    @staticmethod
+    def parse_json(raw: str) -> Any:
         for tag in ["```json", "```"]:
             if tag in raw:
                 raw = raw.split(tag)[1].split("```")[0]
@@ -72,5 +226,11 @@ class LLM:
         except json.JSONDecodeError:
             return {}
 
+    def ask_json(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> Any:
+        return self.parse_json(self.ask(prompt, cache=cache, semantic=semantic))
+
+    async def aask_json(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> Any:
+        return self.parse_json(await self.aask(prompt, cache=cache, semantic=semantic))
+
 
-llm = LLM()
+llm = Lazy(LLM)    # built on first use: imports the langchain provider packages
@@ -2,7 +2,7 @@
 backend/core/models.py — Pydantic schemas for FastAPI endpoints
 """
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
 
 # ── Shared ────────────────────────────────────────────────
@@ -58,6 +58,17 @@ class GradeRequest(BaseModel):
     session_id:  str = ""
 
 
+class StudentScript(BaseModel):
+    student_id:  str
+    ocr_text:    str = Field(..., description="Full OCR text from this student's answer sheet")
+
+
+class BatchGradeRequest(BaseModel):
+    mock_paper:  MockPaper
+    scripts:     List[StudentScript]
+    session_id:  str = ""
+
+
 class QuestionResult(BaseModel):
     marks_awarded:  int
     marks_total:    int
@@ -69,6 +80,13 @@ class QuestionResult(BaseModel):
     student_answer: str = ""
 
 
+class FeedbackRequest(BaseModel):
+    grading_results: Dict[str, Dict[str, Any]]
+    total_score:     float
+    grade_letter:    str
+    subject:         str = "CS"
+
+
 class GradeResponse(BaseModel):
     grading_results: Dict[str, QuestionResult]
     total_score:     float
@@ -112,10 +130,27 @@ class EvalMetrics(BaseModel):
     dataset_size: int
 
 
+# ── Dataset ingestion ─────────────────────────────────────
+
+class EngagementEvent(BaseModel):
+    """One learner's xAPI activity, shaped like a row of the dataset."""
+    topic:             str = ""
+    raised_hands:      int = Field(0, ge=0)
+    visited_resources: int = Field(0, ge=0)
+    discussion:        int = Field(0, ge=0)
+    performance_class: Literal["L", "M", "H"]
+    absence_days:      Literal["Under-7", "Above-7"] = "Under-7"
+
+
+class DatasetEventsRequest(BaseModel):
+    events: List[EngagementEvent]
+
+
 # ── Health ────────────────────────────────────────────────
 
 class HealthResponse(BaseModel):
-    status:   str
-    llm:      str
-    dataset:  int
-    version:  str
+    status:    str
+    llm:       str
+    dataset:   int
+    version:   str
+    providers: List[Dict[str, Any]] = []
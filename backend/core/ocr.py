@@ -0,0 +1,157 @@
+"""
+backend/core/ocr.py — OCR engine pool + CPU process pool for answer-sheet uploads
+"""
+import asyncio, importlib.util, io, multiprocessing, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from core.config import settings
+
+
+class OCRPool:
+    """Uploads go through `read_pages` / `run`, which execute on a process pool
+    of `workers` processes. A worker reads one page at a time, so it builds a
+    single easyocr reader (in its copy of `ocr_pool`) on first use, keeps it
+    for every later page and reports timings back to the parent."""
+
+    def __init__(self, workers: int = 0):
+        self.workers  = workers or settings.OCR_WORKERS
+        self._procs: ProcessPoolExecutor | None = None
+        self.engine   = ""          # resolved on first use: easyocr | tesseract
+        self._reader  = None
+        self._lock    = threading.Lock()
+        self.warmup_ms: list[float] = []
+        self.pages    = 0
+        self.page_ms  = 0.0
+
+    def engine_name(self) -> str:
+        if not self.engine:
+            # find_spec, not import: the parent process never needs torch loaded
+            found = importlib.util.find_spec("easyocr") is not None
+            self.engine = "easyocr" if found else "tesseract"
+        return self.engine
+
+    def _new_reader(self):
+        import easyocr
+        t0 = time.perf_counter()
+        reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+        self.warmup_ms.append((time.perf_counter() - t0) * 1000)
+        return reader
+
+    def reader(self):
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    self._reader = self._new_reader()
+        return self._reader
+
+    def read_page(self, src: str | bytes) -> str:
+        """OCR one page given as a file path or the raw image bytes."""
+        t0 = time.perf_counter()
+        if self.engine_name() == "easyocr":
+            results = self.reader().readtext(src)
+            text = "\n".join(r[1] for r in results if r[2] > 0.25)
+        else:
+            import pytesseract
+            from PIL import Image
+            img  = Image.open(io.BytesIO(src) if isinstance(src, bytes) else src)
+            text = pytesseract.image_to_string(img, config="--psm 6")
+        with self._lock:
+            self.pages   += 1
+            self.page_ms += (time.perf_counter() - t0) * 1000
+        return text.strip()
+
+    def warmup(self) -> None:
+        """Build this process's reader ahead of the first upload."""
+        if self.engine_name() == "easyocr":
+            self.reader()
+
+    # ── Process pool (parent side) ──────────────────────
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._procs is None:
+            # spawn, not fork: the parent runs an event loop and other threads
+            self._procs = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.OCR_WARMUP,),
+            )
+        return self._procs
+
+    def _discard(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._procs is not broken:
+                return              # another caller already replaced it
+            self._procs = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args):
+        """Run a picklable CPU-bound callable on the OCR process pool. A pool
+        broken by a dead worker (e.g. OOM-killed) is replaced and the call
+        retried once."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            ex = self._executor()
+            try:
+                return await loop.run_in_executor(ex, fn, *args)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                print("⚠️  OCR worker died; restarting the process pool")
+                self._discard(ex)
+
+    async def map(self, fn, items: list) -> list:
+        """`run` over every item concurrently; results keep the input order."""
+        return list(await asyncio.gather(*(self.run(fn, item) for item in items)))
+
+    async def read_pages(self, pages: list[str | bytes]) -> list[str]:
+        results = await self.map(_ocr_page, pages)
+        with self._lock:
+            for _, ms, warmups in results:
+                self.pages   += 1
+                self.page_ms += ms
+                self.warmup_ms.extend(warmups)
+        return [text for text, _, _ in results]
+
+    def start(self) -> None:
+        """Spawn every worker now (their initializer loads a reader if OCR_WARMUP)."""
+        ex = self._executor()
+        for _ in range(self.workers):
+            ex.submit(_noop)
+
+    def shutdown(self) -> None:
+        if self._procs is not None:
+            self._procs.shutdown(wait=False, cancel_futures=True)
+            self._procs = None
+
+    def stats(self) -> dict:
+        return {
+            "engine":      self.engine or "not loaded",
+            "workers":     self.workers,
+            "readers":     len(self.warmup_ms),     # loaded so far, across workers
+            "warmup_ms":   round(sum(self.warmup_ms) / len(self.warmup_ms), 1) if self.warmup_ms else None,
+            "pages":       self.pages,
+            "avg_page_ms": round(self.page_ms / self.pages, 1) if self.pages else None,
+        }
+
+
+ocr_pool = OCRPool()
+
+
+# ── Worker-process side ───────────────────────────────────
+def _init_worker(warmup: bool) -> None:
+    if warmup:
+        ocr_pool.warmup()
+
+
+def _noop() -> None:
+    return None
+
+
+def _ocr_page(src: str | bytes) -> tuple[str, float, list[float]]:
+    """OCR one page in a pool worker → (text, elapsed ms, new reader load times)."""
+    t0   = time.perf_counter()
+    text = ocr_pool.read_page(src)
+    ms   = (time.perf_counter() - t0) * 1000
+    warmups = ocr_pool.warmup_ms[:]
+    ocr_pool.warmup_ms.clear()
+    return text, ms, warmups
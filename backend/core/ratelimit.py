@@ -0,0 +1,199 @@
+"""
+backend/core/ratelimit.py — per-provider request/token buckets, priorities and retry backoff
+"""
+import asyncio, contextvars, heapq, itertools, random, threading, time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# Lower runs first when callers are queued on the limiter
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+RETRYABLE = {408, 409, 429, 500, 502, 503, 504}
+# Not worth repeating on the same provider, but another may accept the call
+FAILOVER  = {401, 403, 404}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=NORMAL)
+
+
+@contextmanager
+def priority(level: int):
+    """Run LLM calls made inside the block (and tasks started from it) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """`capacity` units refilled continuously over a minute. A zero capacity
+    means unlimited. The level may go negative when a call turns out to cost
+    more than was reserved; later callers then wait it off."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate     = per_minute / 60.0
+        self.level    = float(per_minute)
+        self.updated  = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level   = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def debit(self, amount: float) -> None:
+        if self.capacity:
+            self.level -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one provider.
+    Waiting callers are served by priority, then arrival order; a 429 with
+    Retry-After pauses everyone until the provider is ready again."""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens   = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._queue: list[list] = []      # [priority, seq, future | None]
+        self._seq  = itertools.count()
+        self._lock = threading.Lock()
+        self.granted = self.retries = self.throttled = 0
+        self.waited  = 0.0
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.requests.capacity or self.tokens.capacity)
+
+    def _delay(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            return max(self._paused_until - now,
+                       self.requests.delay(1, now),
+                       self.tokens.delay(tokens, now))
+
+    def _take(self, tokens: int) -> None:
+        with self._lock:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.granted += 1
+
+    async def acquire(self, tokens: int, level: Optional[int] = None) -> None:
+        """Wait for one request slot and `tokens` tokens."""
+        if not self.limited and self._paused_until <= time.monotonic():
+            self._take(tokens)
+            return
+        loop = asyncio.get_running_loop()
+        me   = [current_priority() if level is None else level, next(self._seq), None]
+        heapq.heappush(self._queue, me)
+        t0 = time.monotonic()
+        try:
+            while True:
+                if self._queue[0] is me:
+                    delay = self._delay(tokens)
+                    if delay <= 0:
+                        self._take(tokens)
+                        return
+                    # Short naps so a higher-priority arrival can take over the head
+                    await asyncio.sleep(min(delay, 0.5))
+                else:
+                    me[2] = loop.create_future()
+                    await me[2]
+        finally:
+            self._queue.remove(me)
+            heapq.heapify(self._queue)
+            if self._queue and self._queue[0][2] is not None and not self._queue[0][2].done():
+                self._queue[0][2].set_result(None)
+            waited = time.monotonic() - t0
+            if waited > 0.001:
+                self.throttled += 1
+                self.waited    += waited
+
+    def acquire_blocking(self, tokens: int) -> None:
+        """Thread-side `acquire` for the sync client (no priority ordering)."""
+        while (delay := self._delay(tokens)) > 0:
+            time.sleep(min(delay, 0.5))
+        self._take(tokens)
+
+    def debit(self, tokens: int) -> None:
+        """Charge tokens only known after the call (the completion)."""
+        with self._lock:
+            self.tokens.debit(tokens)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        return {
+            "rpm":        int(self.requests.capacity),
+            "tpm":        int(self.tokens.capacity),
+            "waiting":    len(self._queue),
+            "granted":    self.granted,
+            "throttled":  self.throttled,
+            "retries":    self.retries,
+            "avg_wait_ms": round(self.waited / self.throttled * 1000, 1) if self.throttled else 0.0,
+        }
+
+
+# ── Retry policy ──────────────────────────────────────────
+def status_of(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_of(exc)
+    if code is not None:
+        return code in RETRYABLE
+    # No HTTP status: timeouts and dropped connections are worth another try
+    name = type(exc).__name__.lower()
+    return "timeout" in name or "connection" in name
+
+
+def can_fail_over(exc: BaseException) -> bool:
+    """True when the failure is the provider's (any 5xx, a rejected key or
+    model, a dropped connection) rather than the request's, so a different
+    provider might still answer it."""
+    code = status_of(exc)
+    if code is not None:
+        return code >= 500 or code in RETRYABLE or code in FAILOVER
+    return is_retryable(exc) or isinstance(exc, OSError)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After(-ms) headers."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if ms := headers.get("retry-after-ms"):
+            return float(ms) / 1000
+        if value := headers.get("retry-after"):
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
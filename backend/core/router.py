@@ -0,0 +1,264 @@
+"""
+backend/core/router.py — route LLM calls across providers with health tracking, failover and hedging
+"""
+import asyncio, itertools, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from core.config import settings
+from core.ratelimit import RateLimiter, backoff, can_fail_over, is_retryable, retry_after, status_of
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 chars per token for English prose; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+# The provider that produced the current task's latest answer: failover and
+# hedging mean it is not always the primary
+answered_by: ContextVar["Provider | None"] = ContextVar("answered_by", default=None)
+
+
+class Provider:
+    """One chat-model client with its own quota, concurrency and rolling
+    latency / error window. `concurrency` caps async calls in flight to it
+    across the whole process, whichever request or agent they come from. A
+    provider whose recent error rate crosses ROUTER_MAX_ERROR_RATE is marked
+    down for ROUTER_COOLDOWN seconds."""
+
+    def __init__(self, name: str, model: str, client, concurrency: int = 0,
+                 limiter: RateLimiter | None = None):
+        self.name        = name
+        self.model       = model
+        self.client      = client
+        self.concurrency = concurrency or settings.GROQ_CONCURRENCY
+        self.limiter     = limiter or RateLimiter()
+        self.slots       = asyncio.Semaphore(self.concurrency)
+        self.latency: deque[float] = deque(maxlen=settings.ROUTER_WINDOW)   # seconds, successes
+        self.outcomes: deque[bool] = deque(maxlen=settings.ROUTER_WINDOW)   # True = error
+        self.down_until = 0.0
+        self.calls = self.errors = self.hedges = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}/{self.model}"
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def record(self, ok: bool, secs: float = 0.0) -> None:
+        self.calls += 1
+        self.outcomes.append(not ok)
+        if ok:
+            self.latency.append(secs)
+            return
+        self.errors += 1
+        if (len(self.outcomes) >= settings.ROUTER_MIN_SAMPLES
+                and self.error_rate() >= settings.ROUTER_MAX_ERROR_RATE):
+            self.down_until = time.monotonic() + settings.ROUTER_COOLDOWN
+            # Start the next window afresh so one bad spell isn't held against it
+            self.outcomes.clear()
+            print(f"⚠️  {self.label} marked down for {settings.ROUTER_COOLDOWN:.0f}s")
+
+    def censor(self, secs: float) -> None:
+        """A call abandoned after `secs` (e.g. it lost a hedge race): not an
+        error, but its latency was at least that long."""
+        self.latency.append(secs)
+
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float) -> float | None:
+        if len(self.latency) < settings.ROUTER_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latency)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(0.50), self.percentile(0.95)
+        return {
+            "provider":   self.label,
+            "healthy":    self.healthy,
+            "p50_ms":     round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms":     round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "calls":      self.calls,
+            "errors":     self.errors,
+            "hedges":     self.hedges,
+            "limiter":    self.limiter.stats(),
+        }
+
+
+class Router:
+    """Sends each call to the first healthy provider in configured order.
+    Provider-side failures (5xx, rejected key or model, dropped connection)
+    fail over to the next provider at once; only retryable ones are tried
+    again once every provider has failed, after a backoff honouring
+    Retry-After. With
+    ROUTER_HEDGE on, a call still running after the provider's p95 latency is
+    duplicated to the next provider and the first answer wins."""
+
+    def __init__(self, providers: list[Provider]):
+        self.providers = providers
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def primary(self) -> Provider | None:
+        return self.providers[0] if self.providers else None
+
+    def _pick(self, tried: set) -> list[Provider]:
+        """Candidates for the next attempt, best first."""
+        fresh = [p for p in self.providers if p not in tried] or self.providers
+        return sorted(fresh, key=lambda p: not p.healthy)     # stable: keeps config order
+
+    def _retry_delay(self, p: Provider, exc: Exception, attempt: int) -> float:
+        delay = retry_after(exc)
+        if delay is None:
+            delay = backoff(attempt, settings.LLM_BACKOFF_BASE, settings.LLM_BACKOFF_CAP)
+        if status_of(exc) == 429:
+            p.limiter.pause(delay)
+        p.limiter.retries += 1
+        return delay
+
+    def _next(self, p: Provider, exc: Exception, attempt: int, tried: set) -> float:
+        """Note a failed attempt on `p` → seconds to wait before the next one
+        (0 when another provider is still untried)."""
+        retryable = is_retryable(exc)
+        if attempt >= settings.LLM_MAX_RETRIES or not (retryable or can_fail_over(exc)):
+            raise exc
+        delay = self._retry_delay(p, exc, attempt) if retryable else 0.0
+        tried.add(p)
+        if any(q not in tried and q.healthy for q in self.providers):
+            print(f"⚠️  {p.label} failed ({exc}); failing over")
+            return 0.0
+        if not retryable:
+            raise exc
+        tried.clear()
+        print(f"⚠️  {p.label} failed ({exc}); retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    @staticmethod
+    def _used_tokens(msg) -> int:
+        usage = getattr(msg, "usage_metadata", None) or {}
+        return usage.get("output_tokens") or approx_tokens(str(msg.content))
+
+    # ── Sync ─────────────────────────────────────────────
+    def invoke(self, prompt: str):
+        tried: set = set()
+        for attempt in itertools.count():
+            p = self._pick(tried)[0]
+            p.limiter.acquire_blocking(approx_tokens(prompt))
+            t0 = time.perf_counter()
+            try:
+                msg = p.client.invoke(prompt)
+            except Exception as e:
+                p.record(False)
+                time.sleep(self._next(p, e, attempt, tried))
+                continue
+            p.record(True, time.perf_counter() - t0)
+            p.limiter.debit(self._used_tokens(msg))
+            answered_by.set(p)
+            return msg
+
+    # ── Async ────────────────────────────────────────────
+    async def _raw(self, p: Provider, prompt: str):
+        if hasattr(p.client, "ainvoke"):
+            return await p.client.ainvoke(prompt)
+        # Sync-only client: run it on a dedicated pool, never on the loop
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(settings.GROQ_CONCURRENCY, settings.OPENROUTER_CONCURRENCY),
+                thread_name_prefix="llm",
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, p.client.invoke, prompt)
+
+    async def _call(self, p: Provider, prompt: str):
+        async with p.slots:
+            await p.limiter.acquire(approx_tokens(prompt))
+            t0 = time.perf_counter()
+            try:
+                msg = await self._raw(p, prompt)
+            except asyncio.CancelledError:
+                # Lost a hedge race: dropping the sample would bias p95 low
+                p.censor(time.perf_counter() - t0)
+                raise
+            except Exception:
+                p.record(False)
+                raise
+        p.record(True, time.perf_counter() - t0)
+        p.limiter.debit(self._used_tokens(msg))
+        return p, msg
+
+    async def _hedged(self, p: Provider, backup: Provider | None, prompt: str):
+        p95 = p.percentile(0.95)
+        if not settings.ROUTER_HEDGE or backup is None or not backup.healthy or p95 is None:
+            return await self._call(p, prompt)
+
+        tasks = [asyncio.ensure_future(self._call(p, prompt))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=p95)
+            if done:
+                return tasks[0].result()
+            backup.hedges += 1
+            tasks.append(asyncio.ensure_future(self._call(backup, prompt)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise tasks[0].exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ainvoke(self, prompt: str):
+        tried: set = set()
+        for attempt in itertools.count():
+            ranked = self._pick(tried)
+            p, backup = ranked[0], ranked[1] if len(ranked) > 1 else None
+            try:
+                winner, msg = await self._hedged(p, backup, prompt)
+                answered_by.set(winner)
+                return msg
+            except Exception as e:
+                if delay := self._next(p, e, attempt, tried):
+                    await asyncio.sleep(delay)
+
+    async def astream(self, prompt: str):
+        """Yield completion chunks; fails over only before the first chunk."""
+        tried: set = set()
+        for attempt in itertools.count():
+            p = self._pick(tried)[0]
+            t0, sent = time.perf_counter(), 0
+            try:
+                # The slot is held until the stream ends: its connection is busy
+                async with p.slots:
+                    await p.limiter.acquire(approx_tokens(prompt))
+                    t0 = time.perf_counter()
+                    if hasattr(p.client, "astream"):
+                        async for chunk in p.client.astream(prompt):
+                            if chunk.content:
+                                sent += len(chunk.content)
+                                yield chunk.content
+                    else:
+                        msg = await self._raw(p, prompt)
+                        sent = len(msg.content)
+                        yield msg.content
+            except Exception as e:
+                p.record(False)
+                # Once text has gone out a retry would repeat it, so give up
+                if sent:
+                    raise
+                if delay := self._next(p, e, attempt, tried):
+                    await asyncio.sleep(delay)
+                continue
+            p.record(True, time.perf_counter() - t0)
+            p.limiter.debit(sent // 4 + 1)
+            answered_by.set(p)
+            return
+
+    def stats(self) -> list[dict]:
+        return [p.stats() for p in self.providers]
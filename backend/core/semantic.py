@@ -0,0 +1,129 @@
+"""
+backend/core/semantic.py — near-duplicate lookup for cached prompts (hashed TF vectors + cosine NN)
+"""
+import math, re, threading, zlib
+from collections import Counter
+from typing import Optional
+import numpy as np
+from core.config import settings
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def vectorize(text: str, dim: int = 0) -> np.ndarray:
+    """L2-normalised hashed term-frequency vector of words and character
+    trigrams. No vocabulary to fit, CPU only; trigrams keep OCR typos and
+    word-order changes close together."""
+    dim   = dim or settings.SEMANTIC_DIM
+    words = _WORD.findall(text.lower())
+    feats = Counter(words)
+    for w in words:
+        padded = f" {w} "
+        feats.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    vec = np.zeros(dim, dtype=np.float32)
+    if not feats:
+        return vec
+    # crc32, not hash(): must be stable across processes and restarts
+    hashes  = np.fromiter((zlib.crc32(f.encode()) for f in feats), dtype=np.uint32, count=len(feats))
+    weights = np.fromiter((1 + math.log(n) for n in feats.values()), dtype=np.float32, count=len(feats))
+    signs   = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+    np.add.at(vec, hashes % dim, signs * weights)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticIndex:
+    """Maps texts to the exact cache keys their answers were stored under.
+    `match` returns the key of the most similar stored text when its cosine
+    similarity clears the threshold. Holds at most `max_entries` rows and
+    overwrites the oldest once full."""
+
+    def __init__(self, threshold: float = 0.0, max_entries: int = 0, dim: int = 0):
+        self.threshold   = threshold or settings.SEMANTIC_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_MAX_ENTRIES
+        self.dim         = dim or settings.SEMANTIC_DIM
+        self._rows = np.zeros((0, self.dim), dtype=np.float32)
+        self._keys: list[str] = []
+        self._next = 0                  # slot to overwrite once full
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def match(self, text: str) -> Optional[tuple[str, float]]:
+        """→ (cache key, similarity) of the nearest stored text, if close enough."""
+        q = vectorize(text, self.dim)
+        with self._lock:
+            n = len(self._keys)
+            if n:
+                sims = self._rows[:n] @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self.hits += 1
+                    return self._keys[best], float(sims[best])
+            self.misses += 1
+            return None
+
+    def add(self, text: str, key: str) -> None:
+        vec = vectorize(text, self.dim)
+        with self._lock:
+            if key in self._keys:
+                self._rows[self._keys.index(key)] = vec
+                return
+            n = len(self._keys)
+            if n < self.max_entries:
+                if n == len(self._rows):
+                    grown = np.zeros((min(self.max_entries, max(16, 2 * n)), self.dim), dtype=np.float32)
+                    grown[:n] = self._rows
+                    self._rows = grown
+                self._rows[n] = vec
+                self._keys.append(key)
+            else:
+                self._rows[self._next] = vec
+                self._keys[self._next] = key
+                self._next = (self._next + 1) % self.max_entries
+
+    def discard(self, key: str) -> None:
+        """Forget a key whose cache entry has gone (expired or evicted)."""
+        with self._lock:
+            if key in self._keys:
+                i = self._keys.index(key)
+                # Unmatchable rather than removed, so slots stay put
+                self._rows[i] = 0
+                self._keys[i] = ""
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows = np.zeros((0, self.dim), dtype=np.float32)
+            self._keys = []
+            self._next = 0
+
+    def __len__(self) -> int:
+        return sum(1 for k in self._keys if k)
+
+    def stats(self) -> dict:
+        return {
+            "entries":   len(self),
+            "threshold": self.threshold,
+            "hits":      self.hits,
+            "misses":    self.misses,
+        }
+
+
+_indexes: dict[tuple[str, str], SemanticIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def semantic_index(namespace: str, scope: str = "", threshold: float = 0.0) -> Optional[SemanticIndex]:
+    """The index for `namespace`, or None if it hasn't opted in through
+    SEMANTIC_NAMESPACES. `scope` (e.g. the model) keeps answers from
+    different models apart; `threshold` overrides SEMANTIC_THRESHOLD."""
+    if namespace not in settings.SEMANTIC_NAMESPACES:
+        return None
+    with _indexes_lock:
+        if (namespace, scope) not in _indexes:
+            _indexes[(namespace, scope)] = SemanticIndex(threshold=threshold)
+        return _indexes[(namespace, scope)]
+
+
+def semantic_stats() -> dict:
+    return {f"{ns}/{scope}" if scope else ns: idx.stats() for (ns, scope), idx in _indexes.items()}
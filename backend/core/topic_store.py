@@ -0,0 +1,105 @@
+"""
+backend/core/topic_store.py — versioned on-disk store of precomputed learn-mode content
+"""
+import json, os, re, shutil, threading, time, uuid
+from pathlib import Path
+from typing import Any, Optional
+from core.config import settings
+
+
+def _slug(topic: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")
+
+
+class TopicStore:
+    """One directory per version (a hash of the prompts and model that made
+    the content), one JSON file per topic and kind:
+
+        data/topic_store/<version>/<kind>/<topic-slug>.json
+
+    Writes go to a temp file and are renamed into place, so readers in other
+    processes never see half a file. Misses and the version list are also
+    remembered, for MISS_TTL seconds, so a topic that isn't there yet does not
+    hit the disk on every request; another worker's writes show up after that."""
+
+    MISS_TTL = 30.0
+
+    def __init__(self, root: Path | str = ""):
+        self.root   = Path(root or settings.TOPIC_STORE_DIR)
+        self._mem: dict[tuple[str, str, str], Any] = {}
+        self._missing: dict[tuple[str, str, str], float] = {}   # key → retry after
+        self._versions: tuple[float, list[str]] | None = None
+        self._lock  = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _path(self, version: str, kind: str, topic: str) -> Path:
+        return self.root / version / kind / f"{_slug(topic)}.json"
+
+    def get(self, version: str, kind: str, topic: str) -> Optional[Any]:
+        key = (version, kind, topic)
+        with self._lock:
+            if key in self._mem:
+                self.hits += 1
+                return self._mem[key]
+            if self._missing.get(key, 0) > time.monotonic():
+                self.misses += 1
+                return None
+        try:
+            value = json.loads(self._path(version, kind, topic).read_text())["value"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._missing[key] = time.monotonic() + self.MISS_TTL
+                self.misses += 1
+            return None
+        with self._lock:
+            self._mem[key] = value
+            self.hits += 1
+        return value
+
+    def put(self, version: str, kind: str, topic: str, value: Any) -> None:
+        path = self._path(version, kind, topic)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps({"topic": topic, "created": time.time(), "value": value}))
+        os.replace(tmp, path)
+        with self._lock:
+            self._mem[(version, kind, topic)] = value
+            self._missing.pop((version, kind, topic), None)
+            if self._versions is not None and version not in self._versions[1]:
+                self._versions = None
+
+    def versions(self) -> list[str]:
+        """Versions on disk, newest first."""
+        with self._lock:
+            if self._versions is not None and self._versions[0] > time.monotonic():
+                return self._versions[1]
+        if not self.root.exists():
+            found = []
+        else:
+            dirs  = [d for d in self.root.iterdir() if d.is_dir()]
+            found = [d.name for d in sorted(dirs, key=lambda d: d.stat().st_mtime, reverse=True)]
+        with self._lock:
+            self._versions = (time.monotonic() + self.MISS_TTL, found)
+        return found
+
+    def get_stale(self, current: str, kind: str, topic: str) -> Optional[Any]:
+        """The newest copy made under any other version."""
+        for version in self.versions():
+            if version != current and (value := self.get(version, kind, topic)) is not None:
+                return value
+        return None
+
+    def count(self, version: str, kind: str) -> int:
+        d = self.root / version / kind
+        return sum(1 for _ in d.glob("*.json")) if d.exists() else 0
+
+    def prune(self, keep: str) -> list[str]:
+        """Delete every version except `keep`."""
+        dropped = [v for v in self.versions() if v != keep]
+        for version in dropped:
+            shutil.rmtree(self.root / version, ignore_errors=True)
+        with self._lock:
+            self._mem      = {k: v for k, v in self._mem.items() if k[0] == keep}
+            self._missing  = {k: t for k, t in self._missing.items() if k[0] == keep}
+            self._versions = None
+        return dropped
@@ -0,0 +1,86 @@
+"""
+backend/core/uploads.py — upload size limits, and upload bodies without a second copy
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import BinaryIO
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from core.config import settings
+
+MB = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadLimit:
+    """ASGI middleware capping multipart request bodies at UPLOAD_MAX_TOTAL_BYTES
+    (all files of one request together). A larger Content-Length is refused
+    before anything is read; a chunked body is cut off as soon as it passes
+    the cap, before Starlette spools the rest."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or []) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            return await self.app(scope, receive, send)
+
+        limit  = settings.UPLOAD_MAX_TOTAL_BYTES
+        detail = f"Uploads are limited to {limit // MB} MB per request"
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        seen = 0
+
+        async def limited():
+            nonlocal seen
+            message = await receive()
+            if message["type"] == "http.request":
+                seen += len(message.get("body", b""))
+                if seen > limit:
+                    raise HTTPException(413, detail)
+            return message
+
+        await self.app(scope, limited, send)
+
+
+def _size(file) -> int:
+    if file.size is not None:
+        return file.size
+    pos = file.file.seek(0, 2)
+    file.file.seek(0)
+    return pos
+
+
+@asynccontextmanager
+async def open_upload(file):
+    """Yield the upload as bytes (≤ UPLOAD_SPOOL_BYTES) or as Starlette's own
+    spooled file, rewound. Extractors accept either; a large file is hashed
+    in chunks and only read whole where fitz or the OCR pool need bytes."""
+    if _size(file) > settings.UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"{file.filename} is larger than {settings.UPLOAD_MAX_BYTES // MB} MB")
+    await file.seek(0)
+    if _size(file) <= settings.UPLOAD_SPOOL_BYTES:
+        yield await file.read()
+    else:
+        yield file.file
+
+
+def as_bytes(src: bytes | str | BinaryIO) -> bytes | str:
+    """A picklable form of `src` for the OCR process pool."""
+    if hasattr(src, "read"):
+        src.seek(0)
+        return src.read()
+    return src
+
+
+async def aas_bytes(src: bytes | str | BinaryIO) -> bytes | str:
+    """`as_bytes`, reading a file in a thread rather than on the event loop."""
+    if hasattr(src, "read"):
+        return await asyncio.to_thread(as_bytes, src)
+    return src
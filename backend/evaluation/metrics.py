@@ -34,6 +34,39 @@ def compute_grading_metrics(grading_results: dict) -> dict:
     }
 
 
+def compute_class_metrics(students: list) -> dict:
+    """Class-level aggregates over graded scripts (as returned by
+    GradingAgent.agrade_script): grading metrics over every answer in the class
+    plus the score distribution and per-question averages."""
+    if not students:
+        return {}
+    every_answer = {
+        f"{i}:{qn}": r
+        for i, s in enumerate(students)
+        for qn, r in s["grading_results"].items()
+    }
+    scores = np.array([s["total_score"] for s in students], dtype=float)
+    grades: dict = {}
+    for s in students:
+        grades[s["grade_letter"]] = grades.get(s["grade_letter"], 0) + 1
+    per_question: dict = {}
+    for s in students:
+        for qn, r in s["grading_results"].items():
+            per_question.setdefault(qn, []).append(r.get("percentage", 0))
+
+    return {
+        **compute_grading_metrics(every_answer),
+        "students":           len(students),
+        "mean_score":         round(float(scores.mean()), 2),
+        "median_score":       round(float(np.median(scores)), 2),
+        "std_score":          round(float(scores.std()), 2),
+        "min_score":          round(float(scores.min()), 2),
+        "max_score":          round(float(scores.max()), 2),
+        "grade_distribution": grades,
+        "question_averages":  {qn: round(float(np.mean(v)), 2) for qn, v in per_question.items()},
+    }
+
+
 def compute_learning_metrics(mastery_dict: dict) -> dict:
     if not mastery_dict:
         return {}
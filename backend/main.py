@@ -2,42 +2,83 @@
 backend/main.py — EduAgent AI  FastAPI Application
 Run: uvicorn main:app --reload --port 8000
 """
-import uuid, os, shutil
+import asyncio, json, re, uuid
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from core.config import settings
 from core.llm import llm
+from core.httpclient import http_clients
+from core.semantic import semantic_stats
 from core.dataset import dataset
+from core.cohorts import ALL
+from core.ocr import ocr_pool
+from core.uploads import UploadLimit, aas_bytes, open_upload, UploadTooLarge
+from core.jobs import jobs, QueueFull
+from core.ratelimit import priority, INTERACTIVE, BACKGROUND
+from core.lazy import load
 from core.models import (
     AnalysePaperRequest, AnalysePaperResponse,
-    GradeRequest, GradeResponse,
+    GradeRequest, GradeResponse, FeedbackRequest, BatchGradeRequest,
     LearnRequest, LearnResponse,
-    EvalMetrics, HealthResponse,
+    EvalMetrics, HealthResponse, DatasetEventsRequest,
     MockPaper, PaperAnalysis,
 )
 from agents.paper_analyzer import paper_analyzer
 from agents.mock_generator  import mock_generator
 from agents.grading_agent   import grading_agent
 from agents.learning_agent  import learning_agent
-from evaluation.metrics     import compute_grading_metrics, compute_learning_metrics
+from evaluation.metrics     import (
+    compute_grading_metrics, compute_class_metrics, compute_learning_metrics,
+)
 
 
 # ── App ───────────────────────────────────────────────────
+async def _warm_topics():
+    try:
+        print(f"✅ Topic store → {await learning_agent.warm_up()}")
+    except Exception as e:
+        print(f"⚠️  Topic warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings.setup()
+    if settings.STARTUP_WARMUP:
+        # Singletons are built on first use; do it now so no request pays for it
+        await asyncio.to_thread(load, dataset, llm, paper_analyzer, mock_generator,
+                                grading_agent, learning_agent)
+    if settings.OCR_WARMUP:
+        # Spawn OCR workers now; each loads its model in the background
+        ocr_pool.start()
+    jobs.start()
+    # Fill in (or refresh after a prompt/model change) precomputed learn content
+    warmup = asyncio.create_task(_warm_topics()) if settings.TOPIC_WARMUP else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    await jobs.stop()
+    ocr_pool.shutdown()
+    await http_clients.aclose()
+
+
 app = FastAPI(
     title="EduAgent AI",
     description="Intelligent Adaptive Learning — Llama 3.3 + LangGraph",
     version="2.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    lifespan=lifespan,
 )
 
+app.add_middleware(UploadLimit)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS + ["*"],
@@ -47,14 +88,21 @@ app.add_middleware(
 )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 # ── Health ────────────────────────────────────────────────
 @app.get("/api/health", response_model=HealthResponse, tags=["System"])
 async def health():
+    providers = llm.router.stats()
     return HealthResponse(
-        status="ok",
+        # degraded: every configured provider is currently marked down
+        status="degraded" if providers and not any(p["healthy"] for p in providers) else "ok",
         llm=llm.provider,
         dataset=dataset.n,
         version="2.0.0",
+        providers=providers,
     )
 
 
@@ -64,11 +112,53 @@ async def stats():
     return {
         "dataset": dataset.summary(),
         "llm_provider": llm.provider,
+        "llm_cache": llm.cache.stats(),
+        "llm_coalesced_calls": llm.coalesced,
+        "semantic_cache": semantic_stats(),
+        "llm_providers": llm.router.stats(),
+        "llm_http": http_clients.stats(),
+        "ocr": ocr_pool.stats(),
+        "jobs": await jobs.stats(),
+        "topic_store": learning_agent.store_stats(),
+        "paper_cache": {
+            "text":     paper_analyzer.text_cache.stats(),
+            "analysis": paper_analyzer.analysis_cache.stats(),
+        },
         "topics_available": 54,
         "timestamp": datetime.utcnow().isoformat(),
     }
 
 
+@app.get("/api/stats/cohorts", tags=["System"])
+async def cohort_stats(
+    topic:   Optional[str] = None,
+    cls:     Optional[str] = Query(None, alias="class"),
+    absence: Optional[str] = None,
+):
+    """Precomputed Topic × Class × absence-band aggregates. With no filters,
+    every cell; otherwise the one cell matching them, unfiltered dimensions
+    rolled up ("*")."""
+    if topic is None and cls is None and absence is None:
+        return {"cohorts": dataset.cube.rows()}
+    row = dataset.cube.row(topic or ALL, cls or ALL, absence or ALL)
+    if row is None:
+        raise HTTPException(404, "No records for that cohort")
+    return row
+
+
+@app.post("/api/dataset/events", tags=["System"])
+async def ingest_events(req: DatasetEventsRequest):
+    """Fold live engagement events into the dataset statistics that mastery
+    scoring and /api/stats read; takes effect on the next request."""
+    if not req.events:
+        raise HTTPException(400, "At least one event is required")
+    if len(req.events) > settings.DATASET_EVENTS_MAX_BATCH:
+        raise HTTPException(413, f"At most {settings.DATASET_EVENTS_MAX_BATCH} events per batch")
+    events = [e.model_dump() for e in req.events]
+    await asyncio.to_thread(dataset.ingest, events)
+    return {"ingested": len(events), "dataset": dataset.summary()}
+
+
 # ── Paper Upload (multipart) ──────────────────────────────
 @app.post("/api/paper/upload", tags=["Paper"])
 async def upload_paper(file: UploadFile = File(...)):
@@ -78,38 +168,30 @@ async def upload_paper(file: UploadFile = File(...)):
     if ext not in allowed:
         raise HTTPException(400, f"Unsupported file type: {ext}. Use PDF or image.")
 
-    tmp_path = str(settings.UPLOAD_DIR / f"{uuid.uuid4()}{ext}")
     try:
-        with open(tmp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        async with open_upload(file) as src:
+            text, file_hash = await paper_analyzer.aextract(src, pdf=ext == ".pdf")
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
 
-        if ext == ".pdf":
-            text = paper_analyzer.extract_pdf(tmp_path)
-        else:
-            text = paper_analyzer.extract_image(tmp_path)
+    if not text or len(text.strip()) < 30:
+        raise HTTPException(422, "Could not extract text. Try a clearer scan.")
 
-        if not text or len(text.strip()) < 30:
-            raise HTTPException(422, "Could not extract text. Try a clearer scan.")
-
-        return {
-            "filename": file.filename,
-            "text":     text,
-            "chars":    len(text),
-            "status":   "ok",
-        }
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    return {
+        "filename":  file.filename,
+        "file_hash": file_hash,
+        "text":      text,
+        "chars":     len(text),
+        "status":    "ok",
+    }
 
 
 # ── Analyse Paper ─────────────────────────────────────────
-@app.post("/api/paper/analyse", tags=["Paper"])
-async def analyse_paper(req: AnalysePaperRequest):
-    """Analyse paper text with Llama 3.3 and generate a mock paper."""
+async def _analyse_paper(text: str) -> dict:
     session_id = str(uuid.uuid4())
 
-    analysis  = paper_analyzer.analyse(req.text)
-    questions = mock_generator.generate(analysis)
+    analysis  = await paper_analyzer.aanalyse(text)
+    questions = await mock_generator.agenerate(analysis)
 
     mock = {
         "subject":     analysis.get("subject", "CS"),
@@ -119,27 +201,95 @@ async def analyse_paper(req: AnalysePaperRequest):
         "created_at":  datetime.utcnow().isoformat(),
     }
 
-    # PDF generation (non-blocking fallback)
-    pdf_filename = f"mock_{session_id[:8]}.pdf"
-    pdf_path     = mock_generator.export_pdf(mock, pdf_filename)
-    pdf_url      = f"/api/paper/pdf/{pdf_filename}" if pdf_path else None
+    # PDF is rendered lazily on first download, once per distinct paper
+    pdf_url = f"/api/paper/pdf/{await mock_generator.aremember(mock)}"
 
     return {
         "session_id": session_id,
+        "paper_hash": paper_analyzer.text_digest(text),
         "analysis":   analysis,
         "mock_paper": mock,
         "pdf_url":    pdf_url,
     }
 
 
+async def _analyse_paper_job(payload: dict) -> dict:
+    # Queued analyses give way to interactive requests at the rate limiter
+    with priority(BACKGROUND):
+        return await _analyse_paper(payload["text"])
+
+
+jobs.register("paper.analyse", _analyse_paper_job)
+jobs.on_housekeep(lambda: mock_generator.prune_pending())
+
+
+@app.post("/api/paper/analyse", tags=["Paper"])
+async def analyse_paper(req: AnalysePaperRequest):
+    """Analyse paper text with Llama 3.3 and generate a mock paper."""
+    return await _analyse_paper(req.text)
+
+
+@app.post("/api/paper/analyse/jobs", status_code=202, tags=["Paper"])
+async def submit_analyse_job(req: AnalysePaperRequest):
+    """Queue a paper analysis and return at once. Poll `status_url` or
+    subscribe to `events_url` (SSE); the finished job's `result` has the same
+    shape as /api/paper/analyse."""
+    try:
+        job_id = await jobs.submit("paper.analyse", {"text": req.text})
+    except QueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "10"})
+    return {
+        "job_id":     job_id,
+        "status":     "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
+
+
+@app.delete("/api/paper/cache", tags=["Paper"])
+async def clear_paper_cache(digest: str = ""):
+    """Drop cached extraction/analysis for one paper (`file_hash` or `paper_hash`),
+    or for every paper when no digest is given."""
+    paper_analyzer.invalidate(digest)
+    return {"status": "ok", "invalidated": digest or "all"}
+
+
+# ── Jobs ──────────────────────────────────────────────────
+@app.get("/api/jobs/{job_id}", tags=["Jobs"])
+async def job_status(job_id: str):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/events", tags=["Jobs"])
+async def job_events(job_id: str):
+    """Server-Sent Events: one `status` event per state change, ending at done/failed."""
+    if await jobs.get(job_id) is None:
+        raise HTTPException(404, "Job not found")
+
+    async def events():
+        async for job in jobs.watch(job_id):
+            yield _sse("status", job)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ── Download Mock Paper PDF ───────────────────────────────
 @app.get("/api/paper/pdf/{filename}", tags=["Paper"])
 async def download_pdf(filename: str):
-    path = settings.MOCK_PDF_DIR / filename
-    if not path.exists():
+    if not re.fullmatch(r"mock_[0-9a-f]{8,64}\.pdf", filename):
+        raise HTTPException(404, "PDF not found")
+    path = await mock_generator.aget_pdf(filename)
+    if not path:
         raise HTTPException(404, "PDF not found")
     return FileResponse(
-        str(path),
+        path,
         media_type="application/pdf",
         filename=filename,
     )
@@ -149,35 +299,17 @@ async def download_pdf(filename: str):
 @app.post("/api/answers/upload", tags=["Grading"])
 async def upload_answers(files: list[UploadFile] = File(...)):
     """Upload handwritten answer sheet photos. Returns combined OCR text."""
-    try:
-        import easyocr
-        reader = easyocr.Reader(["en"], gpu=False, verbose=False)
-        engine = "easyocr"
-    except ImportError:
-        reader = None
-        engine = "tesseract"
-
-    pages = []
-    for i, f in enumerate(files, 1):
-        ext = Path(f.filename).suffix.lower()
-        tmp = str(settings.UPLOAD_DIR / f"{uuid.uuid4()}{ext}")
-        try:
-            with open(tmp, "wb") as fp:
-                shutil.copyfileobj(f.file, fp)
-
-            if engine == "easyocr" and reader:
-                results = reader.readtext(tmp)
-                text    = "\n".join(r[1] for r in results if r[2] > 0.25)
-            else:
-                import pytesseract
-                from PIL import Image
-                text = pytesseract.image_to_string(Image.open(tmp), config="--psm 6")
-
-            pages.append(f"=== PAGE {i} ===\n{text.strip()}")
-        finally:
-            if os.path.exists(tmp):
-                os.unlink(tmp)
+    engine = ocr_pool.engine_name()
 
+    try:
+        async with AsyncExitStack() as stack:
+            srcs = [await stack.enter_async_context(open_upload(f)) for f in files]
+            # All pages OCR in parallel on the process pool, returned in upload order
+            texts = await ocr_pool.read_pages([await aas_bytes(s) for s in srcs])
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+
+    pages = [f"=== PAGE {i} ===\n{text}" for i, text in enumerate(texts, 1)]
     return {
         "pages": len(pages),
         "ocr_text": "\n\n".join(pages),
@@ -196,30 +328,17 @@ async def grade_answers(req: GradeRequest):
     if not req.ocr_text or not qs:
         raise HTTPException(400, "ocr_text and mock_paper.questions are required")
 
-    student_answers = grading_agent.parse_answers(req.ocr_text, qs)
-    results = {}
-    earned  = 0
-
-    for q in qs:
-        qn  = q.get("number", "Q1")
-        mks = q.get("marks", 10)
-        r   = grading_agent.grade_one(
-            qn,
-            student_answers.get(qn, "No answer provided"),
-            q.get("model_answer", ""),
-            mks,
-            q.get("topic", "General"),
-        )
-        results[qn] = r
-        earned     += r["marks_awarded"]
+    with priority(INTERACTIVE):
+        student_answers = await grading_agent.aparse_answers(req.ocr_text, qs)
+        results = await grading_agent.agrade_all(qs, student_answers)
 
     total  = mock.get("total_marks", 100)
-    pct    = round(earned / total * 100, 1) if total > 0 else 0
-    letter, _ = grading_agent.letter_grade(pct)
+    earned, pct, letter = grading_agent.score(results, total)
     report    = grading_agent.build_report(results, mock, earned, total, pct)
-    feedback  = grading_agent.post_grade_feedback(
-        results, pct, letter, mock.get("subject", "CS")
-    )
+    with priority(INTERACTIVE):
+        feedback = await grading_agent.apost_grade_feedback(
+            results, pct, letter, mock.get("subject", "CS")
+        )
 
     session_id = req.session_id or str(uuid.uuid4())
     metrics    = compute_grading_metrics(results)
@@ -229,22 +348,67 @@ async def grade_answers(req: GradeRequest):
         "grading_results": results,
         "total_score":     pct,
         "grade_letter":    letter,
+        "ungraded":        grading_agent.ungraded(results),
         "grade_report":    report,
         "feedback_text":   feedback,
         "metrics":         metrics,
     }
 
 
-# ── Learn Mode ────────────────────────────────────────────
-@app.post("/api/learn", tags=["Learning"])
-async def run_learning(req: LearnRequest):
-    """Generate personalised learning path + content + assessment + feedback."""
-    if not req.goal or len(req.goal.strip()) < 3:
-        raise HTTPException(400, "Please provide a learning goal")
+@app.post("/api/grade/batch", tags=["Grading"])
+async def grade_class(req: BatchGradeRequest):
+    """Grade a whole class against one mock paper, streamed as Server-Sent Events:
+    one `student` event per finished script (`error` if it failed), then `done`
+    with class-level metrics."""
+    mock = req.mock_paper.model_dump()
+    if not mock.get("questions"):
+        raise HTTPException(400, "mock_paper.questions are required")
+    if not req.scripts:
+        raise HTTPException(400, "At least one script is required")
+    if len(req.scripts) > settings.GRADE_BATCH_MAX_SCRIPTS:
+        raise HTTPException(413, f"At most {settings.GRADE_BATCH_MAX_SCRIPTS} scripts per batch")
 
-    result     = learning_agent.run(req.goal)
     session_id = req.session_id or str(uuid.uuid4())
+    scripts    = [s.model_dump() for s in req.scripts]
+
+    async def events():
+        graded, failed = [], []
+        with priority(INTERACTIVE):
+            async for script, result in grading_agent.agrade_class(mock, scripts):
+                if isinstance(result, Exception):
+                    failed.append(script["student_id"])
+                    yield _sse("error", {"student_id": script["student_id"], "detail": str(result)})
+                    continue
+                graded.append(result)
+                yield _sse("student", result)
+        yield _sse("done", {
+            "session_id": session_id,
+            "graded":     len(graded),
+            "failed":     failed,
+            "metrics":    compute_class_metrics(graded),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/grade/feedback/stream", tags=["Grading"])
+async def stream_grade_feedback(req: FeedbackRequest):
+    """Stream the post-exam feedback for an already graded paper as plain text."""
+    return StreamingResponse(
+        grading_agent.stream_post_grade_feedback(
+            req.grading_results, req.total_score, req.grade_letter, req.subject
+        ),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+
+# ── Learn Mode ────────────────────────────────────────────
+def _learn_response(result: dict, session_id: str) -> dict:
     mastery_dict = {t["topic"]: t["mastery"] for t in result["topics_covered"]}
     metrics      = compute_learning_metrics(mastery_dict)
 
@@ -258,6 +422,51 @@ async def run_learning(req: LearnRequest):
     }
 
 
+@app.post("/api/learn", tags=["Learning"])
+async def run_learning(req: LearnRequest):
+    """Generate personalised learning path + content + assessment + feedback."""
+    if not req.goal or len(req.goal.strip()) < 3:
+        raise HTTPException(400, "Please provide a learning goal")
+
+    result     = await learning_agent.arun(req.goal)
+    session_id = req.session_id or str(uuid.uuid4())
+    return _learn_response(result, session_id)
+
+
+@app.post("/api/learn/stream", tags=["Learning"])
+async def stream_learning(req: LearnRequest):
+    """Same as /api/learn, streamed as Server-Sent Events:
+    `plan` first, one `topic` per finished topic, then `done` with metrics."""
+    if not req.goal or len(req.goal.strip()) < 3:
+        raise HTTPException(400, "Please provide a learning goal")
+
+    session_id = req.session_id or str(uuid.uuid4())
+
+    async def events():
+        async for event, data in learning_agent.astream(req.goal):
+            if event == "done":
+                data = _learn_response(data, session_id)
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/learn/content/stream", tags=["Learning"])
+async def stream_topic_content(topic: str):
+    """Stream the study notes for one topic as plain text while they are written."""
+    if len(topic.strip()) < 3:
+        raise HTTPException(400, "Please provide a topic")
+    return StreamingResponse(
+        learning_agent.stream_content(topic.strip()),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ── Evaluation ────────────────────────────────────────────
 @app.get("/api/evaluate/baseline", tags=["Evaluation"])
 async def baseline_metrics():
@@ -1,11 +1,35 @@
 """
 backend/tests/conftest.py — shared pytest fixtures
 """
-import sys, os, pytest
+import sys, os, tempfile, pytest
 
 # Make backend root importable
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+# Keep test runs out of the shared on-disk cache and job queue in data/
+os.environ.setdefault("CACHE_BACKEND", "memory")
+_TMP = tempfile.mkdtemp(prefix="eduagent-tests-")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_TMP, "jobs.sqlite3"))
+os.environ.setdefault("TOPIC_STORE_DIR", os.path.join(_TMP, "topic_store"))
+os.environ.setdefault("DATASET_CACHE_DIR", os.path.join(_TMP, "dataset_cache"))
+
+# The app creates its data directories at startup, which ASGITransport skips
+from core.config import settings
+settings.setup()
+
+
+@pytest.fixture(autouse=True)
+def topic_store(monkeypatch, tmp_path):
+    """Fresh precomputed-topic store per test, so stored content never leaks
+    between tests (runs before setup_method, which builds new agents)."""
+    from core.config import settings
+    from core.topic_store import TopicStore
+    import agents.learning_agent
+    monkeypatch.setattr(settings, "TOPIC_STORE_DIR", tmp_path / "topic_store")
+    store = TopicStore()
+    monkeypatch.setattr(agents.learning_agent.learning_agent, "store", store)
+    return store
+
 
 @pytest.fixture
 def sample_paper_text():
@@ -65,3 +89,133 @@ def sample_grading_results():
                "correct_points": ["Correct start"],
                "missing_points": ["Priority queue", "Relaxation"], "topic": "Graphs"},
     }
+
+
+class FakeLLM:
+    """Stand-in for core.llm.LLM: returns canned replies after a fixed delay
+    and records the peak number of overlapping calls."""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay       = delay
+        self.provider    = "Fake/test"
+        self.calls       = 0
+        self.in_flight   = 0
+        self.peak        = 0
+        self.prompts     = []
+        self.drop        = set()    # question numbers left out of batch replies
+
+    def _reply(self, prompt: str):
+        if "Grade each exam answer" in prompt:
+            import re
+            return {n: {"marks_awarded": 7, "grade": "Good", "correct_points": ["ok"],
+                        "missing_points": [], "feedback": "Fine."}
+                    for n in re.findall(r"^### (\S+) \|", prompt, re.M) if n not in self.drop}
+        if "Grade this exam answer" in prompt:
+            return {"marks_awarded": 7, "grade": "Good", "correct_points": ["ok"],
+                    "missing_points": [], "feedback": "Fine."}
+        if "Map handwritten answers" in prompt:
+            return {}
+        if "exam-quality questions" in prompt:
+            return [{"question": "Define it.", "difficulty": "easy",
+                     "correct_answer": "A definition.", "marks": 10}]
+        if "expert examiner" in prompt:
+            return {"subject": "Data Structures", "total_marks": 100,
+                    "estimated_duration": "3 hours", "topics": ["Trees"],
+                    "questions": [], "difficulty_distribution": {"easy": 100},
+                    "type_distribution": {"theory": 100}, "key_concepts": ["BST"]}
+        return "Keep going!"
+
+    def from_primary(self) -> bool:
+        return True
+
+    def ask(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> str:
+        r = self.ask_json(prompt, cache)
+        return r if isinstance(r, str) else str(r)
+
+    def ask_json(self, prompt: str, cache: bool = True, semantic: tuple = ()):
+        import time
+        self.calls     += 1
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak       = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return self._reply(prompt)
+        finally:
+            self.in_flight -= 1
+
+    async def aask(self, prompt: str, cache: bool = True, semantic: tuple = ()) -> str:
+        r = await self.aask_json(prompt, cache)
+        return r if isinstance(r, str) else str(r)
+
+    async def aask_json(self, prompt: str, cache: bool = True, semantic: tuple = ()):
+        import asyncio
+        self.calls     += 1
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak       = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._reply(prompt)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    import agents.grading_agent, agents.learning_agent
+    import agents.paper_analyzer, agents.mock_generator
+    from core.cache import MemoryCache
+    from core.config import settings
+    fake = FakeLLM()
+    fake.model = "fake-model"
+    for mod in (agents.grading_agent, agents.learning_agent,
+                agents.paper_analyzer, agents.mock_generator):
+        monkeypatch.setattr(mod, "llm", fake)
+    analyzer = agents.paper_analyzer.paper_analyzer
+    monkeypatch.setattr(analyzer, "text_cache", MemoryCache())
+    monkeypatch.setattr(analyzer, "analysis_cache", MemoryCache())
+    monkeypatch.setattr(settings, "MOCK_PDF_DIR", tmp_path / "mock_pdfs")
+    return fake
+
+
+class SlowProvider:
+    """Fake langchain chat model: `ainvoke` sleeps without blocking the loop."""
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.calls = 0
+
+    def _message(self, prompt):
+        from types import SimpleNamespace
+        self.calls += 1
+        return SimpleNamespace(content=f"stub reply ({len(str(prompt))} chars)")
+
+    def invoke(self, prompt):
+        import time
+        time.sleep(self.delay)
+        return self._message(prompt)
+
+    async def ainvoke(self, prompt):
+        import asyncio
+        await asyncio.sleep(self.delay)
+        return self._message(prompt)
+
+    async def astream(self, prompt):
+        import asyncio
+        from types import SimpleNamespace
+        self.calls += 1
+        for word in ["streamed ", "stub ", "reply"]:
+            await asyncio.sleep(self.delay / 3)
+            yield SimpleNamespace(content=word)
+
+
+@pytest.fixture
+def slow_provider(monkeypatch):
+    from core.llm import llm
+    from core.router import Provider, Router
+    provider = SlowProvider()
+    monkeypatch.setattr(llm, "router", Router([Provider("Slow", "slow-model", provider)]))
+    from core.cache import MemoryCache
+    monkeypatch.setattr(llm, "cache", MemoryCache())
+    return provider
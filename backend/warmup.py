@@ -0,0 +1,23 @@
+"""
+backend/warmup.py — precompute learn-mode content and questions for every KNOWLEDGE_GRAPH topic
+Run: python warmup.py [--concurrency 4] [--refresh]
+"""
+import argparse, asyncio, json
+from core.config import settings
+from agents.learning_agent import learning_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=settings.TOPIC_WARMUP_CONCURRENCY,
+                        help="max LLM calls in flight")
+    parser.add_argument("--refresh", action="store_true",
+                        help="regenerate every topic, not just missing ones")
+    args = parser.parse_args()
+
+    result = asyncio.run(learning_agent.warm_up(refresh=args.refresh, concurrency=args.concurrency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
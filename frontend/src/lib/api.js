@@ -16,6 +16,35 @@ async function req(method, path, body, isForm = false) {
   return res.json();
 }
 
+// POST + Server-Sent Events: calls onEvent(event, data) for each event as it arrives
+async function stream(path, body, onEvent) {
+  const res = await fetch(`${BASE}${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({ detail: res.statusText }));
+    throw new Error(err.detail || `HTTP ${res.status}`);
+  }
+  const reader  = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let cut;
+    while ((cut = buf.indexOf("\n\n")) >= 0) {
+      const block = buf.slice(0, cut);
+      buf = buf.slice(cut + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1] || "message";
+      const data  = block.match(/^data: (.*)$/m)?.[1];
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 export const api = {
   health:         ()              => req("GET",  "/api/health"),
   stats:          ()              => req("GET",  "/api/stats"),
@@ -23,7 +52,9 @@ export const api = {
   analysePaper:   (text)          => req("POST", "/api/paper/analyse", { text }),
   uploadAnswers:  (files)         => { const f = new FormData(); files.forEach(fl => f.append("files", fl)); return req("POST", "/api/answers/upload", f, true); },
   grade:          (mock, ocr, id) => req("POST", "/api/grade", { mock_paper: mock, ocr_text: ocr, session_id: id || "" }),
+  gradeBatch:     (mock, scripts, onEvent, id) => stream("/api/grade/batch", { mock_paper: mock, scripts, session_id: id || "" }, onEvent),
   learn:          (goal, id)      => req("POST", "/api/learn",  { goal, session_id: id || "" }),
+  learnStream:    (goal, onEvent, id) => stream("/api/learn/stream", { goal, session_id: id || "" }, onEvent),
   baseline:       ()              => req("GET",  "/api/evaluate/baseline"),
   pdfUrl:         (filename)      => `${BASE}/api/paper/pdf/${filename}`,
 };